@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+"""Benchmark of proBioPred.py and proBioPred_batch_run.py with the stand-in
+tools of stubtool.py, so that it runs without BLAST+, RGI/CARD or libsvm.
+
+Measures per-stage latency of the external tools, per-genome wall time of the
+single-genome script, and batch throughput for a range of worker counts.
+Every run appends one JSON record to the results file together with the git
+revision, and is compared with the last record of the same configuration.
+"""
+
+import argparse
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+repoDir = os.path.dirname(benchDir)
+TOOLS = ["makeblastdb", "tblastn", "blastp", "rgi", "svm-predict"]
+
+def makeGenome(fileName, size, contigs, seed):
+    """Write synthetic genome of random sequence split into contigs
+
+    Arguments:
+        fileName {str} -- [output FASTA file]
+        size {int} -- [genome size in bp]
+        contigs {int} -- [number of contigs]
+        seed {int} -- [random seed]
+    """
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, size), contigs - 1)) if contigs > 1 else []
+    with open(fileName, "w") as out:
+        for n, (start, end) in enumerate(zip([0] + cuts, cuts + [size])):
+            out.write(">contig%d\n" % (n + 1))
+            seq = "".join(rng.choice("ACGT") for i in range(end - start))
+            for i in range(0, len(seq), 80):
+                out.write(seq[i:i + 80] + "\n")
+
+def installStubs(binDir):
+    """Write wrappers named after the tools that run stubtool.py"""
+    os.makedirs(binDir, exist_ok=True)
+    for tool in TOOLS:
+        wrapper = os.path.join(binDir, tool)
+        with open(wrapper, "w") as f:
+            f.write('#!/bin/sh\nexec "%s" "%s" %s "$@"\n' % (sys.executable, os.path.join(benchDir, "stubtool.py"), tool))
+        os.chmod(wrapper, 0o755)
+
+def percentiles(values):
+    """Summary statistics of a list of timings"""
+    if(not values):
+        return dict(n=0)
+    values = np.array(values)
+    return dict(n=len(values), mean=float(values.mean()), p50=float(np.percentile(values, 50)),
+                p90=float(np.percentile(values, 90)), max=float(values.max()))
+
+def stageTimes(logFile):
+    """Per-tool latency from the stub call log"""
+    times = dict()
+    if(os.path.isfile(logFile)):
+        with open(logFile, "r") as f:
+            for line in f:
+                call = json.loads(line)
+                times.setdefault(call["tool"], []).append(call["end"] - call["start"])
+    return dict([(tool, percentiles(t)) for tool, t in sorted(times.items())])
+
+def gitRevision():
+    try:
+        return subprocess.run(["git", "-C", repoDir, "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def runScript(script, args, env):
+    """Run a script of the working tree and return its wall time
+
+    Raises:
+        RuntimeError -- [script failed]
+    """
+    start = time.time()
+    proc = subprocess.run([sys.executable, os.path.join(repoDir, "scripts", script)] + args, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if(proc.returncode != 0):
+        raise RuntimeError(script + " failed : " + (proc.stderr or proc.stdout).strip())
+    return time.time() - start
+
+def compareWithLast(record, resultsFile):
+    """Print throughput change against the last recorded run of the same configuration"""
+    last = None
+    if(os.path.isfile(resultsFile)):
+        with open(resultsFile, "r") as f:
+            for line in f:
+                old = json.loads(line)
+                if(old["config"] == record["config"]):
+                    last = old
+    if(last is None):
+        return
+    print("\nchange against %s (%s):" % (last["revision"], last["date"]))
+    for workers, batch in record["batch"].items():
+        if(workers in last["batch"]):
+            print("  %s workers: %.2f -> %.2f genomes/s (%+.1f%%)" % (workers, last["batch"][workers]["throughput"], batch["throughput"],
+                  100 * (batch["throughput"] / last["batch"][workers]["throughput"] - 1)))
+    if(last["single"].get("n") and record["single"].get("n")):
+        print("  single genome: %.3f -> %.3f s (%+.1f%%)" % (last["single"]["mean"], record["single"]["mean"],
+              100 * (record["single"]["mean"] / last["single"]["mean"] - 1)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ProBioPred with stand-in BLAST, RGI and libsvm tools.")
+    parser.add_argument('-n','--genomes',default=16,type=int,help='Number of synthetic genomes in the batch [Default: 16].')
+    parser.add_argument('--size',default=200000,type=int,help='Genome size in bp [Default: 200000].')
+    parser.add_argument('--contigs',default=20,type=int,help='Contigs per genome [Default: 20].')
+    parser.add_argument('-g','--genus',default='lactobacillus',type=str,help='Genus of the genomes [Default: lactobacillus].')
+    parser.add_argument('-w','--workers',default='1,2,4',type=str,
+                        help='Comma separated worker counts (-j) to run the batch with [Default: 1,2,4].')
+    parser.add_argument('-t','--threads',default=1,type=int,help='BLAST/RGI threads per genome [Default: 1].')
+    parser.add_argument('--single',default=3,type=int,
+                        help='Number of genomes timed with proBioPred.py one at a time [Default: 3].')
+    parser.add_argument('--latency',default=0.05,type=float,help='Seconds slept by every stand-in tool call [Default: 0.05].')
+    parser.add_argument('--rgi_latency',default=None,type=float,help='Seconds slept by rgi [Default: --latency].')
+    parser.add_argument('--seconds_per_mb',default=0,type=float,help='Extra tool seconds per MB of genome [Default: 0].')
+    parser.add_argument('--hits',default=4,type=int,help='tblastn output lines per query [Default: 4].')
+    parser.add_argument('--rgi_hits',default=40,type=int,help='RGI output rows per genome [Default: 40].')
+    parser.add_argument('--search_mode',default='tblastn',type=str,choices=['tblastn','blastp'],
+                        help='Search program of proBioPred.py and of the batches [Default: tblastn].')
+    parser.add_argument('--group_search',action='store_true',
+                        help='Run the batches with --group_search (one BLAST search per group of genomes).')
+    parser.add_argument('--warm_cache',action='store_true',
+                        help='Share one BLAST database cache between runs instead of starting each run cold.')
+    parser.add_argument('--work_dir',metavar='PATH',default=None,type=str,
+                        help='Directory for genomes and outputs, kept after the run [Default: temporary directory].')
+    parser.add_argument('-r','--results',metavar='PATH',default=os.path.join(benchDir, 'results.jsonl'),type=str,
+                        help='File the run record is appended to [Default: bench/results.jsonl].')
+    args = parser.parse_args()
+
+    workDir = args.work_dir or tempfile.mkdtemp(prefix="probiopred-bench-")
+    os.makedirs(workDir, exist_ok=True)
+    binDir = os.path.join(workDir, "bin")
+    logFile = os.path.join(workDir, "stub_calls.jsonl")
+    installStubs(binDir)
+
+    env = dict(os.environ)
+    env.update(PATH=binDir + os.pathsep + env.get("PATH", ""),
+               PYTHONPATH=repoDir + os.pathsep + env.get("PYTHONPATH", ""),
+               PROBIOPRED_CACHE=os.path.join(workDir, "cache"),
+               PROBIOPRED_STUB_LATENCY=str(args.latency),
+               PROBIOPRED_STUB_SECONDS_PER_MB=str(args.seconds_per_mb),
+               PROBIOPRED_STUB_HITS=str(args.hits),
+               PROBIOPRED_STUB_RGI_HITS=str(args.rgi_hits),
+               PROBIOPRED_STUB_LOG=logFile)
+    if(args.rgi_latency is not None):
+        env["PROBIOPRED_STUB_LATENCY_RGI"] = str(args.rgi_latency)
+
+    # 1. synthetic genomes
+    genomeDir = os.path.join(workDir, "genomes")
+    os.makedirs(genomeDir, exist_ok=True)
+    batchFile = os.path.join(workDir, "batch.tsv")
+    with open(batchFile, "w") as batch:
+        batch.write("genomeID\tgenomeFile\tgenus\n")
+        for i in range(args.genomes):
+            genomeFile = os.path.join(genomeDir, "genome%d.fasta" % (i + 1))
+            if(not os.path.isfile(genomeFile)):
+                makeGenome(genomeFile, args.size, args.contigs, i)
+            batch.write("genome%d\t%s\t%s\n" % (i + 1, genomeFile, args.genus))
+
+    def freshCache():
+        if(not args.warm_cache):
+            shutil.rmtree(env["PROBIOPRED_CACHE"], ignore_errors=True)
+        if(os.path.isfile(logFile)):
+            os.remove(logFile)
+
+    # 2. single genomes through proBioPred.py
+    single = []
+    freshCache()
+    for i in range(min(args.single, args.genomes)):
+        outDir = os.path.join(workDir, "single%d" % (i + 1))
+        shutil.rmtree(outDir, ignore_errors=True)
+        single.append(runScript("proBioPred.py", ["-i", os.path.join(genomeDir, "genome%d.fasta" % (i + 1)), "-g", args.genus,
+                                                  "-o", outDir, "-t", str(args.threads), "--search_mode", args.search_mode], env))
+        print("single genome %d : %.3f s" % (i + 1, single[-1]), file=sys.stderr)
+    stages = stageTimes(logFile)
+
+    # 3. batches with increasing number of workers
+    batches = dict()
+    for workers in [int(w) for w in args.workers.split(",")]:
+        freshCache()
+        outDir = os.path.join(workDir, "batch_j%d" % workers)
+        shutil.rmtree(outDir, ignore_errors=True)
+        wall = runScript("proBioPred_batch_run.py", ["-b", batchFile, "-o", outDir, "-j", str(workers),
+                                                     "-t", str(workers * args.threads), "--search_mode", args.search_mode] +
+                                                    (["--group_search"] if args.group_search else []), env)
+        summary = pd.read_csv(os.path.join(outDir, "stage_summary.tsv"), sep="\t").set_index("stage")
+        summary = summary.astype(object).where(summary.notna(), None)
+        batches[str(workers)] = dict(wall=wall, throughput=args.genomes / wall, stages=stageTimes(logFile),
+                                     trace=summary[["wall_p50", "wall_p90", "cpu_children_mean"]].to_dict("index"))
+        print("batch with %d workers : %.3f s, %.2f genomes/s" % (workers, wall, args.genomes / wall), file=sys.stderr)
+
+    # 4. record results
+    config = dict([(k, v) for k, v in vars(args).items() if k not in ("work_dir", "results")])
+    record = dict(date=time.strftime("%Y-%m-%dT%H:%M:%S"), revision=gitRevision(), host=socket.gethostname(),
+                  cpus=os.cpu_count(), python=sys.version.split()[0], config=config,
+                  single=percentiles(single), stages=stages, batch=batches)
+    print("\nstage latency (single genomes):")
+    for tool, t in stages.items():
+        print("  %-12s n=%-3d mean %.3f s  p90 %.3f s" % (tool, t["n"], t["mean"], t["p90"]))
+    print("per-genome wall time: mean %.3f s" % record["single"]["mean"] if single else "per-genome wall time: not measured")
+    print("batch throughput:")
+    for workers, batch in batches.items():
+        print("  %3s workers  %.2f genomes/s  (%.3f s)" % (workers, batch["throughput"], batch["wall"]))
+    compareWithLast(record, args.results)
+    with open(args.results, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    if(not args.work_dir):
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+"""Deterministic stand-ins for makeblastdb, tblastn, blastp, rgi and svm-predict used
+by the benchmark harness. Installed on PATH by run_bench.py as small wrappers
+named after the tools, which call this file with the tool name first.
+
+Outputs depend only on the inputs, so repeated runs produce the same hits.
+Behaviour is set with environment variables:
+
+    PROBIOPRED_STUB_LATENCY          -- seconds slept by every call [0.05]
+    PROBIOPRED_STUB_LATENCY_<TOOL>   -- per-tool override, e.g. ..._LATENCY_RGI
+    PROBIOPRED_STUB_SECONDS_PER_MB   -- extra seconds per MB of genome [0]
+    PROBIOPRED_STUB_HITS             -- tblastn/blastp output lines per query [4]
+    PROBIOPRED_STUB_RGI_HITS         -- RGI output rows per genome [40]
+    PROBIOPRED_STUB_RGI_VERSION      -- version reported by rgi main [6.0.3]
+    PROBIOPRED_STUB_CARD_VERSION     -- version reported by rgi database [3.2.9]
+    PROBIOPRED_STUB_LOG              -- file to append one JSON line per call
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import re
+import hashlib
+
+baseDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+aroWeightsFile = os.path.join(baseDir, "probiopred", "data", "rgi", "aro_weights.tsv")
+
+RGI_COLUMNS = ["ORF_ID", "Contig", "Start", "Stop", "Orientation", "Cut_Off", "Pass_Bitscore", "Best_Hit_Bitscore",
+               "Best_Hit_ARO", "Best_Identities", "ARO", "Model_type", "SNPs_in_Best_Hit_ARO", "Other_SNPs",
+               "Drug Class", "Resistance Mechanism", "AMR Gene Family", "Predicted_DNA", "Predicted_Protein",
+               "CARD_Protein_Sequence", "Percentage Length of Reference Sequence", "ID", "Model_ID", "Nudged", "Note"]
+
+def option(args, name, default=None):
+    """Value following name in args"""
+    return args[args.index(name) + 1] if name in args else default
+
+def envFloat(name, default):
+    return float(os.environ.get(name, default))
+
+def seedOf(*parts):
+    """Random generator seeded by the content of files or strings"""
+    h = hashlib.sha256()
+    for part in parts:
+        if(os.path.isfile(part)):
+            with open(part, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+        else:
+            h.update(part.encode())
+    return random.Random(h.hexdigest())
+
+def fastaIds(fileName):
+    """Ids of the sequences of a FASTA file"""
+    with open(fileName, "r") as f:
+        return [line[1:].split()[0] for line in f if line.startswith(">") and line[1:].strip()]
+
+def fastaRecords(fileName):
+    """Ids and sequences of the sequences of a FASTA file"""
+    records = []
+    with open(fileName, "r") as f:
+        for line in f:
+            if(line.startswith(">")):
+                if(line[1:].strip()):
+                    records.append((line[1:].split()[0], []))
+            elif(records):
+                records[-1][1].append(line.strip())
+    return [(name, "".join(parts)) for name, parts in records]
+
+def sleepFor(tool, genomeFile=None):
+    """Simulated run time: fixed latency plus a share proportional to genome size"""
+    latency = envFloat("PROBIOPRED_STUB_LATENCY_" + tool.upper().replace("-", "_"), envFloat("PROBIOPRED_STUB_LATENCY", 0.05))
+    if(genomeFile and os.path.isfile(genomeFile)):
+        latency += envFloat("PROBIOPRED_STUB_SECONDS_PER_MB", 0) * os.path.getsize(genomeFile) / 1e6
+    time.sleep(latency)
+
+def makeblastdb(args):
+    genomeFile, out = option(args, "-in", "-"), option(args, "-out")
+    ext = "p" if option(args, "-dbtype") == "prot" else "n"
+    #the database is a copy of the genome or proteins (read from stdin for -in -), so that
+    #tblastn and blastp can read its sequence ids
+    f = sys.stdin.buffer if genomeFile == "-" else open(genomeFile, "rb")
+    with f, open(out + "." + ext + "sq", "wb") as o:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            o.write(block)
+    sleepFor("makeblastdb", out + "." + ext + "sq")
+    for suffix in ("hr", "in"):
+        open(out + "." + ext + suffix, "w").close()
+    return 0
+
+def tblastn(args, tool="tblastn"):
+    query, db, out = option(args, "-query"), option(args, "-db"), option(args, "-out")
+    dbFile = db + (".psq" if tool == "blastp" else ".nsq")
+    sleepFor(tool, dbFile)
+    #contigs of multi-genome databases (G<genome>_<contig>) are searched per genome
+    genomes = dict()
+    for contig, seq in fastaRecords(dbFile) or [("contig1", "")]:
+        genomes.setdefault(contig.split("_")[0] if re.match(r"G\d+_\d+$", contig) else "", []).append((contig, seq))
+    hitsPerQuery = int(envFloat("PROBIOPRED_STUB_HITS", 4))
+    lines = []
+    queries = fastaRecords(query)
+    for genome, records in genomes.items():
+        #seeded by sequences, not ids, so that a genome gets the same hits in a multi-genome
+        #database (renamed contigs) as in its own, and a query whatever its id
+        genomeHash = hashlib.sha256("\n".join(seq for contig, seq in records).encode()).hexdigest()
+        contigs = [contig for contig, seq in records]
+        for queryId, querySeq in queries:
+            rng = seedOf(genomeHash, querySeq)
+            #all lines of a query hit one subject of the genome, as with -max_target_seqs 1
+            subject = rng.choice(contigs)
+            for i in range(hitsPerQuery):
+                #about a third of the hits pass the pident/qcovs/bitscore thresholds
+                pident, qcovs, bitscore = rng.uniform(30, 100), rng.randint(40, 100), rng.uniform(20, 600)
+                start = rng.randint(1, 100000)
+                lines.append("%s\t%s\t%.3f\t%d\t%.2e\t%.1f\t%d\t%d\n" % (queryId, subject, pident, qcovs,
+                                                                         10 ** -rng.uniform(1, 100), bitscore, start, start + 900))
+    o = open(out, "w") if out else sys.stdout
+    o.writelines(lines)
+    if(out):
+        o.close()
+    return 0
+
+def blastp(args):
+    return tblastn(args, "blastp")
+
+def rgi(args):
+    if("--version" in args):
+        #rgi main --version / rgi database --version (CARD)
+        print(os.environ.get("PROBIOPRED_STUB_RGI_VERSION", "6.0.3") if args[0] == "main" else os.environ.get("PROBIOPRED_STUB_CARD_VERSION", "3.2.9"))
+        return 0
+    genomeFile, out = option(args, "-i"), option(args, "-o")
+    sleepFor("rgi", genomeFile)
+    with open(aroWeightsFile, "r") as f:
+        accessions = [line.split("\t")[0] for line in f][1:]
+    rng = seedOf(genomeFile, "rgi")
+    contigs = fastaIds(genomeFile) or ["contig1"]
+    with open(out + ".txt", "w") as o:
+        o.write("\t".join(RGI_COLUMNS) + "\n")
+        for i in range(int(envFloat("PROBIOPRED_STUB_RGI_HITS", 40))):
+            row = ["n/a"] * len(RGI_COLUMNS)
+            row[0], row[1] = "%s_%d" % (contigs[i % len(contigs)], i + 1), contigs[i % len(contigs)]
+            row[9], row[10] = "%.2f" % rng.uniform(40, 100), rng.choice(accessions)
+            o.write("\t".join(row) + "\n")
+    with open(out + ".json", "w") as o:
+        o.write("{}\n")
+    return 0
+
+def svmPredict(args):
+    #svm-predict [-b 1] test_file model_file output_file
+    testFile, modelFile, outFile = args[-3:]
+    sleepFor("svm-predict")
+    with open(testFile, "r") as f, open(outFile, "w") as o:
+        o.write("labels 1 -1\n")
+        for line in f:
+            p = seedOf(line, modelFile).random()
+            o.write("%s %g %g\n" % ("1" if p >= 0.5 else "-1", p, 1 - p))
+    return 0
+
+TOOLS = {"makeblastdb": makeblastdb, "tblastn": tblastn, "blastp": blastp, "rgi": rgi, "svm-predict": svmPredict}
+
+def main():
+    tool, args = sys.argv[1], sys.argv[2:]
+    if("--version" in args):
+        return TOOLS[tool](args)
+    start = time.time()
+    code = TOOLS[tool](args)
+    logFile = os.environ.get("PROBIOPRED_STUB_LOG")
+    if(logFile):
+        with open(logFile, "a") as log:
+            log.write(json.dumps(dict(tool=tool, start=start, end=time.time(), pid=os.getpid())) + "\n")
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
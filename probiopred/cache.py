@@ -0,0 +1,163 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import time
+import fcntl
+
+defaultCacheDir = os.environ.get("PROBIOPRED_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "probiopred"))
+defaultCacheSize = 20 * 1024 ** 3
+#entries used more recently than this are never evicted, they may still be read by another run
+evictGrace = 6 * 3600
+
+def contentHash(fileName, chunkSize=1 << 20):
+    """sha256 hex digest of file content
+
+    Arguments:
+        fileName {str} -- [file name]
+
+    Returns:
+        [str] -- [hex digest]
+    """
+    h = hashlib.sha256()
+    with open(fileName, "rb") as f:
+        for chunk in iter(lambda: f.read(chunkSize), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def dirSize(path):
+    """Total size in bytes of files under a directory
+
+    Arguments:
+        path {str} -- [directory name]
+
+    Returns:
+        [int] -- [size in bytes]
+    """
+    size = 0
+    for r, d, f in os.walk(path):
+        for i in f:
+            try:
+                size += os.path.getsize(os.path.join(r, i))
+            except OSError:
+                pass
+    return size
+
+class ContentCache(object):
+    """Directory of cache entries addressed by content key, with a size cap
+    and least-recently-used eviction.
+
+    Each entry is a directory <root>/<key>. Entries are built in a temporary
+    directory and moved in place with an atomic rename, so concurrent runs
+    never see half-written entries. The modification time of the entry
+    directory records its last use; entries used within the last evictGrace
+    seconds are kept even if the cache is over its size cap, so an entry is
+    not removed under a run which is still reading it.
+    """
+
+    def __init__(self, root, maxBytes=defaultCacheSize):
+        """
+        Arguments:
+            root {str} -- [cache directory]
+            maxBytes {int} -- [size cap in bytes, 0 or None to disable eviction]
+        """
+        self.root = os.path.abspath(root)
+        self.maxBytes = maxBytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        """Entry directory for key (may not exist)"""
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Return entry directory if cached (and mark it as used) or None
+
+        Arguments:
+            key {str} -- [entry key]
+
+        Returns:
+            [str] -- [entry directory or None]
+        """
+        entry = self.path(key)
+        if(os.path.isdir(entry)):
+            try:
+                os.utime(entry)
+            except OSError:
+                return None
+            return entry
+        return None
+
+    def remove(self, key):
+        """Remove entry of key, e.g. to rebuild an outdated entry
+
+        Arguments:
+            key {str} -- [entry key]
+        """
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def build(self, key, builder):
+        """Return cached entry, building it with builder(tmpDir) on a miss.
+
+        Arguments:
+            key {str} -- [entry key]
+            builder {function} -- [called with a temporary directory, returns True on success or error object]
+
+        Returns:
+            [tuple] -- [True and entry directory if success or error object and None]
+        """
+        entry = self.get(key)
+        if(entry):
+            return True, entry
+        tmpDir = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            response = builder(tmpDir)
+            if(response is not True):
+                return response, None
+            try:
+                os.rename(tmpDir, self.path(key))
+            except OSError:
+                #built concurrently by another run, keep theirs
+                if(not os.path.isdir(self.path(key))):
+                    raise
+        finally:
+            if(os.path.isdir(tmpDir)):
+                shutil.rmtree(tmpDir, ignore_errors=True)
+        self.evict(keep=key)
+        return True, self.get(key) or self.path(key)
+
+    def evict(self, keep=None, grace=None):
+        """Remove least recently used entries until cache fits the size cap
+
+        Arguments:
+            keep {str} -- [key which is never evicted]
+            grace {float} -- [entries used within this many seconds are never evicted (Default: evictGrace)]
+        """
+        if(not self.maxBytes):
+            return
+        if(grace is None):
+            grace = evictGrace
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            entries = []
+            for key in os.listdir(self.root):
+                entry = self.path(key)
+                if(key.startswith(".") or not os.path.isdir(entry)):
+                    continue
+                try:
+                    entries.append((os.path.getmtime(entry), dirSize(entry), key))
+                except OSError:
+                    pass
+            total = sum(e[1] for e in entries)
+            for mtime, size, key in sorted(entries):
+                if(total <= self.maxBytes):
+                    break
+                if(key == keep or now - mtime < grace):
+                    continue
+                shutil.rmtree(self.path(key), ignore_errors=True)
+                total -= size
+            #stale temporary directories of crashed runs
+            for key in os.listdir(self.root):
+                entry = self.path(key)
+                if(key.startswith(".tmp-") and os.path.isdir(entry) and time.time() - os.path.getmtime(entry) > 86400):
+                    shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,207 @@
+import os
+import gzip
+import shutil
+import hashlib
+import tempfile
+import itertools
+import numpy as np
+
+#letters of nucleotide sequences (IUPAC codes, gaps and stops)
+SEQUENCE_CHARS = b"ACGTUNRYKMSWBDHVacgtunrykmswbdhv-*."
+
+#bacterial genetic code (NCBI table 11), codons in TCAG order
+CODON_TABLE = "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"
+#shortest stop-to-stop protein written by translateORFs (amino acids)
+MIN_ORF_LENGTH = 30
+
+COMPLEMENT = bytes.maketrans(b"ACGTUacgtuRYKMrykmBDHVbdhv", b"TGCAAtgcaaYRMKyrmkVHDBvhdb")
+#base => 0-3 (TCAG), anything else => 4; codon => amino acid, X for codons with other letters
+_BASES = np.full(256, 4, np.uint8)
+for i, b in enumerate(b"TCAG"):
+    _BASES[b] = _BASES[b + 32] = i
+_BASES[ord("U")] = _BASES[ord("u")] = 0
+_CODONS = np.full(125, ord("X"), np.uint8)
+for a, b, c in itertools.product(range(4), repeat=3):
+    _CODONS[a * 25 + b * 5 + c] = ord(CODON_TABLE[a * 16 + b * 4 + c])
+
+def isCompressed(genomeFile):
+    """True if genomeFile is gzip compressed (.gz or bgzip .bgz, detected by content)
+
+    Arguments:
+        genomeFile {str} -- [genome file name]
+
+    Returns:
+        [boolean] -- [True for gzip/bgzip files]
+    """
+    with open(genomeFile, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+def openGenome(genomeFile):
+    """Open genome file for reading bytes, decompressing gzip/bgzip on the fly
+
+    Arguments:
+        genomeFile {str} -- [genome file name]
+
+    Returns:
+        [file] -- [binary file object]
+    """
+    if(isCompressed(genomeFile)):
+        return gzip.open(genomeFile, "rb")
+    return open(genomeFile, "rb")
+
+def readChunks(genomeFile, chunkSize=1 << 20):
+    """Uncompressed content of genome file in chunks, e.g. to feed a command's stdin
+
+    Arguments:
+        genomeFile {str} -- [genome file name]
+        chunkSize {int} -- [bytes per chunk]
+
+    Returns:
+        [generator] -- [bytes chunks]
+    """
+    with openGenome(genomeFile) as f:
+        for chunk in iter(lambda: f.read(chunkSize), b""):
+            yield chunk
+
+def scanGenome(genomeFile):
+    """Validate FASTA structure, compute contig statistics and the content
+    hash of a genome in one streaming pass. The hash is the sha256 of the
+    uncompressed content, so a compressed genome shares cache entries with
+    its plain FASTA file.
+
+    Arguments:
+        genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+
+    Raises:
+        ValueError -- [file is not a valid nucleotide FASTA file]
+
+    Returns:
+        [dict] -- [sha256, compressed, contigs, length, n50, largest and gc]
+    """
+    h = hashlib.sha256()
+    lengths = []
+    gc = acgt = 0
+    try:
+        with openGenome(genomeFile) as f:
+            for n, line in enumerate(f):
+                h.update(line)
+                if(line.startswith(b">")):
+                    if(not line[1:].strip()):
+                        raise ValueError("%s : line %d : empty sequence id" % (genomeFile, n + 1))
+                    if(lengths and lengths[-1] == 0):
+                        raise ValueError("%s : line %d : empty sequence before this header" % (genomeFile, n + 1))
+                    lengths.append(0)
+                    continue
+                seq = line.strip()
+                if(not seq):
+                    continue
+                if(not lengths):
+                    raise ValueError("%s : line %d : sequence before first FASTA header" % (genomeFile, n + 1))
+                if(seq.translate(None, SEQUENCE_CHARS)):
+                    raise ValueError("%s : line %d : not a nucleotide sequence" % (genomeFile, n + 1))
+                lengths[-1] += len(seq)
+                seq = seq.upper()
+                g, c = seq.count(b"G"), seq.count(b"C")
+                gc += g + c
+                acgt += g + c + seq.count(b"A") + seq.count(b"T")
+    except (OSError, EOFError) as e:
+        raise ValueError("%s : %s" % (genomeFile, e))
+    if(not lengths):
+        raise ValueError(genomeFile + " : no FASTA sequences")
+    if(lengths[-1] == 0):
+        raise ValueError(genomeFile + " : empty last sequence")
+    total, n50, cumulative = sum(lengths), 0, 0
+    for length in sorted(lengths, reverse=True):
+        cumulative += length
+        if(cumulative * 2 >= total):
+            n50 = length
+            break
+    return dict(sha256=h.hexdigest(), compressed=isCompressed(genomeFile), contigs=len(lengths), length=total,
+                n50=n50, largest=max(lengths), gc=gc / acgt if acgt else 0)
+
+def decompressTo(genomeFile, scratchDir=None):
+    """Write uncompressed copy of genome to a private scratch directory, for
+    tools which need a plain file (RGI). Remove it with shutil.rmtree on the
+    returned directory.
+
+    Arguments:
+        genomeFile {str} -- [genome file name (gzip/bgzip compressed)]
+        scratchDir {str} -- [parent of the scratch directory (Default: system temporary directory)]
+
+    Returns:
+        [tuple] -- [scratch directory, uncompressed genome file name]
+    """
+    tmpDir = tempfile.mkdtemp(prefix="probiopred-", dir=scratchDir)
+    name = os.path.basename(genomeFile)
+    for ext in (".gz", ".bgz"):
+        if(name.endswith(ext)):
+            name = name[:-len(ext)]
+    outFile = os.path.join(tmpDir, name)
+    with openGenome(genomeFile) as f, open(outFile, "wb") as out:
+        shutil.copyfileobj(f, out, 1 << 20)
+    return tmpDir, outFile
+
+def readContigs(genomeFile):
+    """Contigs of a genome
+
+    Arguments:
+        genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+
+    Returns:
+        [generator] -- [(contig id, sequence bytes)]
+    """
+    contig, parts = None, []
+    with openGenome(genomeFile) as f:
+        for line in f:
+            if(line.startswith(b">")):
+                if(contig is not None):
+                    yield contig, b"".join(parts)
+                contig, parts = (line[1:].split() or [b""])[0].decode(errors="replace"), []
+            else:
+                parts.append(line.strip())
+    if(contig is not None):
+        yield contig, b"".join(parts)
+
+def sixFrames(seq):
+    """Translation of a nucleotide sequence in its six reading frames
+
+    Arguments:
+        seq {bytes} -- [nucleotide sequence]
+
+    Returns:
+        [generator] -- [(frame (+1, +2, +3, -1, -2, -3), protein bytes with * for stops)]
+    """
+    for strand, s in ((1, seq), (-1, seq.translate(COMPLEMENT)[::-1])):
+        codes = _BASES[np.frombuffer(s, np.uint8)].astype(np.int16)
+        for f in range(3):
+            codons = codes[f:f + 3 * ((len(codes) - f) // 3)].reshape(-1, 3)
+            yield strand * (f + 1), _CODONS[codons[:, 0] * 25 + codons[:, 1] * 5 + codons[:, 2]].tobytes()
+
+def translateORFs(genomeFile, outFile, minLength=MIN_ORF_LENGTH):
+    """Translate a genome once into the stop-to-stop open reading frames of
+    its six frames, the protein segments tblastn aligns to, for searching
+    with blastp. Proteins are named <contig>_<frame>_<position>, position
+    being the first base of the ORF on the forward strand for positive
+    frames and the last base for negative frames.
+
+    Arguments:
+        genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+        outFile {str} -- [protein multifasta file]
+        minLength {int} -- [shortest protein written]
+
+    Returns:
+        [int] -- [number of proteins]
+    """
+    n = 0
+    with open(outFile, "wb") as out:
+        for contig, seq in readContigs(genomeFile):
+            for frame, protein in sixFrames(seq):
+                offset = abs(frame) - 1
+                pos = 0
+                for orf in protein.split(b"*"):
+                    if(len(orf) >= minLength):
+                        start = offset + 3 * pos + 1 if frame > 0 else len(seq) - offset - 3 * pos
+                        out.write(b">%s_%+d_%d\n%s\n" % (contig.encode(), frame, start, orf))
+                        n += 1
+                    pos += len(orf) + 1
+    return n
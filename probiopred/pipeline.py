@@ -0,0 +1,595 @@
+import os
+import shutil
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import probiopred.probiopred as mydef
+from probiopred import cache
+from probiopred import stages
+from probiopred import scoring
+from probiopred import trace
+from probiopred import genome
+
+class PipelineError(Exception):
+    """Raised when a stage of the pipeline fails for a genome"""
+
+def runGenome(genomeFile, genus, outDir, threads=1, cacheDir=cache.defaultCacheDir, cacheSize=cache.defaultCacheSize, useCache=True, timeout=None, keepBlast=False, writeHits=True, searchHits=None, searchMode='tblastn'):
+    """Run ProBioPred on one genome: search for probiotic, virulent and
+    antibiotic resistance genes, write the per-genome outputs to outDir and
+    predict the probiotic probability. Time and resources of every stage are
+    written to trace.json in outDir, also when the run fails.
+
+    The genome is read in one streaming pass which validates it, computes its
+    contig statistics (recorded in trace.json) and its content hash. Compressed
+    genomes are streamed to makeblastdb; an uncompressed copy is only written,
+    to a private temporary directory, when RGI has to run on it.
+
+    Arguments:
+        genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+        genus {str} -- [genus of genome, one of GENERA]
+        outDir {str} -- [output directory, created if missing]
+        threads {int} -- [Number of threads to run for BLAST and RGI]
+        cacheDir {str} -- [directory for cached BLAST databases and RGI results]
+        cacheSize {int} -- [size cap of the cache in bytes]
+        useCache {bool} -- [reuse cached BLAST databases and RGI results]
+        timeout {float} -- [seconds after which RGI or tblastn is killed, None for no limit]
+        keepBlast {bool} -- [write filtered BLAST hits to pro_outFiltered.blast and vfdb_outFiltered.blast]
+        writeHits {bool} -- [write hit sequences to pro_hits.pfasta and vfdb_hits.pfasta]
+        searchHits {str} -- [tblastn hits of the genome from a group search (see searchGroup), instead of searching it here]
+        searchMode {str} -- [tblastn against the genome, or blastp against its translated ORFs (cached like the genome database)]
+
+    Returns:
+        [dict] -- [feature scores with prediction and prediction_score, and hits (query set => hit gene ids)]
+    """
+    if(genus.lower() not in mydef.GENERA):
+        raise PipelineError("Unsupported genus : " + genus)
+    if(searchMode not in mydef.SEARCH_MODES):
+        raise PipelineError("Unsupported search mode : " + str(searchMode))
+    genomeFile = os.path.abspath(genomeFile.strip())
+    outDir = os.path.abspath(outDir)
+    os.makedirs(outDir, exist_ok=True)
+    runTrace = trace.Trace()
+    status = "failed"
+    try:
+        result = _runGenome(genomeFile, [genus.lower()], outDir, int(threads), cacheDir, cacheSize, useCache, timeout, keepBlast, writeHits, searchHits, searchMode, runTrace)[genus.lower()]
+        status = "done"
+        return result
+    finally:
+        runTrace.write(os.path.join(outDir, 'trace.json'), genome=genomeFile, genus=genus.lower(), threads=int(threads), status=status,
+                       search_mode='group' if searchHits is not None else searchMode)
+
+def screenGenome(genomeFile, genera, outDir, threads=1, cacheDir=cache.defaultCacheDir, cacheSize=cache.defaultCacheSize, useCache=True, timeout=None, keepBlast=False, writeHits=False, searchMode='tblastn'):
+    """Score one genome with the models of several genera, e.g. when its
+    genus is uncertain. The genome database, RGI and one search of the union
+    of the genera's query sets are shared; the features of every genus are
+    derived from the shared hits and all models are scored concurrently. The
+    genus x probability table is written to genus_screen.tsv in outDir,
+    per-genus hit files to outDir/<genus>.
+
+    Arguments:
+        genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+        genera {list} -- [genera to score, from GENERA]
+        outDir {str} -- [output directory, created if missing]
+        threads {int} -- [Number of threads to run for BLAST and RGI]
+        cacheDir {str} -- [directory for cached BLAST databases and RGI results]
+        cacheSize {int} -- [size cap of the cache in bytes]
+        useCache {bool} -- [reuse cached BLAST databases and RGI results]
+        timeout {float} -- [seconds after which RGI or BLAST is killed, None for no limit]
+        keepBlast {bool} -- [write filtered BLAST hits of every genus]
+        writeHits {bool} -- [write hit sequences of every genus]
+        searchMode {str} -- [tblastn or blastp (see runGenome)]
+
+    Returns:
+        [DataFrame] -- [one row per genus: status, message, prediction, prediction_score, probiotic_probability,
+                        hit counts and features; sorted by probiotic probability]
+    """
+    genera = list(dict.fromkeys(g.lower() for g in genera))
+    unsupported = [g for g in genera if g not in mydef.GENERA]
+    if(unsupported or not genera):
+        raise PipelineError("Unsupported genus : " + ", ".join(unsupported))
+    if(searchMode not in mydef.SEARCH_MODES):
+        raise PipelineError("Unsupported search mode : " + str(searchMode))
+    genomeFile = os.path.abspath(genomeFile.strip())
+    outDir = os.path.abspath(outDir)
+    os.makedirs(outDir, exist_ok=True)
+    runTrace = trace.Trace()
+    status = "failed"
+    try:
+        results = _runGenome(genomeFile, genera, outDir, int(threads), cacheDir, cacheSize, useCache, timeout, keepBlast, writeHits, None, searchMode, runTrace,
+                             writeResults=False)
+        table = pd.DataFrame([screenRow(genus, results[genus]) for genus in genera])
+        table = table.sort_values('probiotic_probability', ascending=False, na_position='last', kind='stable')
+        table.to_csv(os.path.join(outDir, 'genus_screen.tsv'), sep='\t', index=None)
+        status = "done"
+        return table
+    finally:
+        runTrace.write(os.path.join(outDir, 'trace.json'), genome=genomeFile, genus=",".join(genera), threads=int(threads), status=status,
+                       search_mode=searchMode)
+
+def screenRow(genus, result):
+    """Row of the genus screen table (see screenGenome)
+
+    Arguments:
+        genus {str} -- [genus]
+        result {dict/str} -- [result of the genus (see runGenome) or error message]
+
+    Returns:
+        [dict] -- [genus, status, message, prediction, prediction_score, probiotic_probability, hit counts and features]
+    """
+    row = dict(genus=genus, status='failed', message='', prediction=None, prediction_score=None, probiotic_probability=None,
+               pro_hits=None, vfdb_hits=None)
+    row.update([(f, None) for f in mydef.FEATURES])
+    if(isinstance(result, str)):
+        row['message'] = result
+        return row
+    row.update(status='done', prediction=result['prediction'], prediction_score=float(result['prediction_score']))
+    row['probiotic_probability'] = row['prediction_score'] if result['prediction'] == 'Probiotic' else 1 - row['prediction_score']
+    for tag, genes in result['hits'].items():
+        row[tag + '_hits'] = len(genes)
+    row.update([(f, result[f]) for f in mydef.FEATURES])
+    return row
+
+def _runGenome(genomeFile, genera, outDir, threads, cacheDir, cacheSize, useCache, timeout, keepBlast, writeHits, searchHits, searchMode, runTrace,
+               scratchDir=None, writeResults=True):
+    """Stages of runGenome and screenGenome, measured in runTrace. The genome
+    database, RGI and one search of the union of the query sets are shared
+    by all genera; features and predictions are then computed per genus,
+    concurrently. With several genera, per-genus outputs go to
+    outDir/<genus>. Uncompressed copies of compressed genomes go to
+    scratchDir (Default: system temporary directory), resulTab.csv is
+    written with writeResults.
+
+    Returns:
+        [dict] -- [genus => result (see runGenome), or error message if the genus could not be scored]
+    """
+
+    # 1. read input
+    queriesByGenus, models = dict(), dict()
+    for genus in genera:
+        proFile,vfdbFile,models[genus] = mydef.readInput(genus)
+        queriesByGenus[genus] = {'pro': proFile}
+        if(os.path.isfile(vfdbFile)):
+            queriesByGenus[genus]['vfdb'] = vfdbFile
+    genusDirs = dict([(genus, outDir if len(genera) == 1 else os.path.join(outDir, genus)) for genus in genera])
+    for genusDir in genusDirs.values():
+        os.makedirs(genusDir, exist_ok=True)
+
+    # 2. validate genome, then makeblastdb of the genome, or of its translated ORFs
+    #    for blastp (or reuse cached database of identical genome), unless the
+    #    genome was searched with its group
+    with runTrace.stage('scan_genome', [genomeFile]) as record:
+        try:
+            genomeInfo = genome.scanGenome(genomeFile)
+        except ValueError as e:
+            raise PipelineError("Invalid genome file : " + str(e))
+        record.update([(k, v) for k, v in genomeInfo.items() if k != 'sha256'])
+    genomeHash = genomeInfo['sha256'] if useCache else None
+    if(searchHits is not None):
+        genomeDB = None
+    elif(searchMode == 'blastp'):
+        with runTrace.stage('protein_db', [genomeFile]) as record:
+            if(useCache):
+                dbCache = cache.ContentCache(os.path.join(cacheDir,'proteindb'), cacheSize)
+                makedbflag, genomeDB = mydef.cachedProteinDB(genomeFile, dbCache, genomeHash)
+            else:
+                genomeDB = os.path.join(outDir,'proteindb')
+                makedbflag = mydef.makeProteinDB(genomeFile, genomeDB)
+            if(not makedbflag == True):
+                raise PipelineError("Could not make protein blast database : " + str(makedbflag))
+            record["output_bytes"] = trace.fileBytes([genomeDB])
+    else:
+        with runTrace.stage('makeblastdb', [genomeFile]) as record:
+            if(useCache):
+                dbCache = cache.ContentCache(os.path.join(cacheDir,'blastdb'), cacheSize)
+                makedbflag, genomeDB = mydef.cachedBlastDB(genomeFile, dbCache, genomeHash)
+            else:
+                genomeDB = os.path.join(outDir,'genomedb')
+                makedbflag = mydef.makeBlastDB(genomeFile, genomeDB)
+            if(not makedbflag == True):
+                raise PipelineError("Could not make blast database : " + str(makedbflag))
+            record["output_bytes"] = trace.fileBytes([genomeDB])
+
+    scoreDict = dict()
+
+    # 3. RGI and a single tblastn (or blastp) search for probiotic and virulent genes of
+    #    all genera, run concurrently. BLAST output is filtered while it streams from stdout.
+    #    RGI is skipped when its results for the same genome, RGI/CARD version and options are cached.
+    rgiOut = os.path.join(outDir, 'rgi_out')
+    hitsFile = os.path.join(outDir, 'ardb_hits.tsv')
+    rgiKey = rgiCached = None
+    if(useCache):
+        rgiCache = cache.ContentCache(os.path.join(cacheDir,'rgi'), cacheSize)
+        with runTrace.stage('rgi_cache') as record:
+            rgiKey = mydef.rgiCacheKey(genomeHash)
+            if(rgiKey):
+                rgiCached = mydef.cachedRGI(rgiCache, rgiKey, rgiOut, hitsFile)
+            record["hit"] = rgiCached is not None
+    collectors = dict()
+    for genus, queries in queriesByGenus.items():
+        filteredFiles = dict()
+        if(keepBlast):
+            filteredFiles = dict([(tag, os.path.join(genusDirs[genus], tag + '_outFiltered.blast')) for tag in queries])
+        collectors[genus] = scoring.HitCollector(list(queries), filteredFiles)
+    queryFile = os.path.join(outDir, 'queries.pfasta')
+    if(searchHits is None):
+        dispatcher = scoring.QueryDispatcher(mydef.combineGenusQueries(queriesByGenus, queryFile), collectors)
+    else:
+        #hits of a group search, tagged by combineQueries
+        dispatcher = collectors[genera[0]]
+    #RGI needs a plain FASTA file
+    rgiScratch, rgiInput = None, genomeFile
+    if(not rgiCached and genomeInfo['compressed']):
+        with runTrace.stage('decompress_genome', [genomeFile]):
+            rgiScratch, rgiInput = genome.decompressTo(genomeFile, scratchDir)
+    rgiStage = stages.Stage('rgi', mydef.rgiCommand(rgiInput, rgiOut, threads), timeout)
+    blastStage = stages.Stage(searchMode, mydef.blastCommand(queryFile, genomeDB, None, threads, program=searchMode),
+                              timeout, dispatcher.addLine)
+    searchStages = ([] if rgiCached else [rgiStage]) + ([] if searchHits is not None else [blastStage])
+    with runTrace.stage('search', [genomeFile, queryFile],
+                        [os.path.join(outDir, 'rgi_out.txt'), os.path.join(outDir, 'rgi_out.json')]):
+        try:
+            if(searchHits is not None):
+                with open(searchHits, 'r') as f:
+                    for line in f:
+                        dispatcher.addLine(line)
+            results = stages.runStages(searchStages) if searchStages else dict()
+        except (stages.StageError, ValueError) as e:
+            raise PipelineError(str(e))
+        finally:
+            dispatcher.close()
+            if(searchHits is None):
+                os.remove(queryFile)
+            if(rgiScratch):
+                shutil.rmtree(rgiScratch, ignore_errors=True)
+    if(rgiStage.end is not None):
+        runTrace.add('rgi', rgiStage.start, rgiStage.end)
+    if(blastStage.end is not None):
+        runTrace.add(searchMode, blastStage.start, blastStage.end, output_bytes=dispatcher.bytesRead,
+                     hits=sum(c.count(tag) for genus, c in collectors.items() for tag in queriesByGenus[genus]))
+    if(not rgiCached):
+        rgiResponse = stages.checkResponse(results['rgi'])
+        if(not rgiResponse == True):
+            raise PipelineError("Failed to run RGI : " + str(rgiResponse))
+    if(rgiCached and rgiCached['ardb'] is not None):
+        scoreDict["ardb"] = rgiCached['ardb']
+    else:
+        #new RGI output, or cached output scored with other ARO weights
+        with runTrace.stage('ardb_scores', [rgiOut + '.txt'], [hitsFile]):
+            ardbHits = scoring.rgiHits(rgiOut + '.txt').drop(columns='genome')
+            ardbHits.to_csv(hitsFile, sep='\t', index=None)
+            scoreDict["ardb"] = int(ardbHits["weight"].sum())
+        if(rgiKey):
+            with runTrace.stage('rgi_cache_store'):
+                if(rgiCached):
+                    rgiCache.remove(rgiKey)
+                mydef.storeRGI(rgiCache, rgiKey, rgiOut, hitsFile, scoreDict["ardb"])
+    if(searchMode in results):
+        blastFlag = stages.checkResponse(results[searchMode])
+        if(not blastFlag == True):
+            raise PipelineError("Could not do blast : " + str(blastFlag))
+
+    # 4.-7. features and prediction of every genus from the shared hits
+    if(len(genera) == 1):
+        return {genera[0]: _scoreGenus(genera[0], collectors[genera[0]], queriesByGenus[genera[0]], models[genera[0]], dict(scoreDict),
+                                       genusDirs[genera[0]], writeHits, writeResults, runTrace)}
+    with ThreadPoolExecutor(max_workers=len(genera)) as executor:
+        futures = dict([(genus, executor.submit(_scoreGenus, genus, collectors[genus], queriesByGenus[genus], models[genus], dict(scoreDict),
+                                                genusDirs[genus], writeHits, writeResults, runTrace)) for genus in genera])
+        results = dict()
+        for genus, future in futures.items():
+            try:
+                results[genus] = future.result()
+            except PipelineError as e:
+                results[genus] = str(e)
+        return results
+
+def _scoreGenus(genus, collector, queries, model, scoreDict, outDir, writeHits, writeResults, runTrace):
+    """Features and prediction of one genus from its filtered hits (see _runGenome)
+
+    Raises:
+        PipelineError -- [no probiotic genes of the genus found]
+
+    Returns:
+        [dict] -- [result (see runGenome)]
+    """
+    # 4. virulent genes
+    if('vfdb' in queries):
+        scoreDict["vfdb"] = collector.count('vfdb')
+        #extract sequence
+        if(writeHits):
+            with runTrace.stage('extract_vfdb_hits', [], [os.path.join(outDir, 'vfdb_hits.pfasta')]):
+                mydef.extractSeq(collector.genes('vfdb'),queries['vfdb'],os.path.join(outDir, 'vfdb_hits.pfasta'))
+
+    # 5. probiotic genes and creation of scores dictionary
+    #If no probiotic genes found
+    if(collector.count('pro') < 1):
+        raise PipelineError("Cannot proceed. No probiotic genes found")
+    with runTrace.stage('category_scores'):
+        scoreDict = scoreDict | scoring.categoryScores(collector.table('pro')).iloc[0].to_dict()
+    #extract sequences
+    if(writeHits):
+        with runTrace.stage('extract_pro_hits', [], [os.path.join(outDir, 'pro_hits.pfasta')]):
+            mydef.extractSeq(collector.genes('pro'),queries['pro'],os.path.join(outDir, 'pro_hits.pfasta'))
+
+    # 6. run prediction (in-process)
+    with runTrace.stage('prediction', [model]):
+        result = dict(zip(mydef.FEATURES, mydef.featureVector(scoreDict)))
+        result['prediction'], result['prediction_score'] = mydef.predict([scoreDict], model)[0]
+
+    # 7. write results
+    if(writeResults):
+        with runTrace.stage('write_results', [], [os.path.join(outDir, 'resulTab.csv')]):
+            pd.DataFrame([result]).to_csv(os.path.join(outDir, 'resulTab.csv'),index=None,sep='\t')
+    result['hits'] = dict([(tag, sorted(collector.genes(tag))) for tag in queries])
+    return result
+
+def searchGroup(genomeFiles, genus, groupDir, threads=1, timeout=None):
+    """Search the probiotic and virulence queries of a genus once against a
+    multi-genome BLAST database of a group of genomes, and split the hits
+    into one file per genome (to be passed to runGenome as searchHits).
+
+    Every database sequence is reported per query (-max_target_seqs), so that
+    the best subject of every genome is kept. pident, qcovs and bitscore do
+    not depend on the database size, so the filtered hits are those of
+    separate searches.
+
+    Arguments:
+        genomeFiles {dict} -- [genome id => genome file name (FASTA, may be gzip/bgzip compressed)]
+        genus {str} -- [genus of the genomes, one of GENERA]
+        groupDir {str} -- [directory for the database and the hit files, created if missing]
+        threads {int} -- [Number of threads for tblastn]
+        timeout {float} -- [seconds after which makeblastdb or tblastn is killed, None for no limit]
+
+    Returns:
+        [tuple] -- [dict of genome id => hit file, dict of genome id => error of genomes which could not be searched]
+    """
+    groupDir = os.path.abspath(groupDir)
+    os.makedirs(groupDir, exist_ok=True)
+    runTrace = trace.Trace()
+    proFile,vfdbFile,model = mydef.readInput(genus)
+    queries = {'pro': proFile}
+    if(os.path.isfile(vfdbFile)):
+        queries['vfdb'] = vfdbFile
+    groupFasta, groupDB = os.path.join(groupDir, 'genomes.fasta'), os.path.join(groupDir, 'groupdb')
+    try:
+        with runTrace.stage('combine_genomes', list(genomeFiles.values()), [groupFasta]):
+            seqGenomes, failures = mydef.combineGenomes(genomeFiles, groupFasta)
+        hitFiles = dict([(genomeId, os.path.join(groupDir, genomeId + '.hits')) for genomeId in genomeFiles if genomeId not in failures])
+        if(not hitFiles):
+            return hitFiles, failures
+        with runTrace.stage('makeblastdb', [groupFasta], [groupDB]):
+            makedbflag = mydef.runCommand('makeblastdb', mydef.makeBlastDBCommand(groupFasta, groupDB, True), timeout)
+            if(not makedbflag == True):
+                raise PipelineError("Could not make blast database : " + str(makedbflag))
+        mydef.combineQueries(queries, os.path.join(groupDir, 'queries.pfasta'))
+        demux = scoring.HitDemultiplexer(seqGenomes, hitFiles)
+        with runTrace.stage('tblastn', [os.path.join(groupDir, 'queries.pfasta')], list(hitFiles.values())):
+            try:
+                results = stages.runStages([stages.Stage('tblastn', mydef.blastCommand(os.path.join(groupDir, 'queries.pfasta'), groupDB, None,
+                                                                                       threads, len(seqGenomes)), timeout, demux.addLine)])
+            except (stages.StageError, ValueError) as e:
+                raise PipelineError(str(e))
+            finally:
+                demux.close()
+        blastFlag = stages.checkResponse(results['tblastn'])
+        if(not blastFlag == True):
+            raise PipelineError("Could not do blast : " + str(blastFlag))
+        return hitFiles, failures
+    finally:
+        #the database is only needed for this search
+        for f in os.listdir(groupDir):
+            if(f.startswith('groupdb.') or f in ('genomes.fasta', 'queries.pfasta')):
+                os.remove(os.path.join(groupDir, f))
+        runTrace.write(os.path.join(groupDir, 'trace.json'), genus=genus, genomes=len(genomeFiles), threads=threads)
+
+def groupJob(groupId, genomeFiles, genus, groupDir, threads, timeout=None):
+    """Run searchGroup in a worker process. Failures are returned instead of
+    raised, so that one group does not stop the batch.
+
+    Returns:
+        [tuple] -- [groupId, status ("done"/"failed"), message, hit files and errors of genomes (see searchGroup)]
+    """
+    try:
+        hitFiles, failures = searchGroup(genomeFiles, genus, groupDir, threads, timeout)
+        return groupId, "done", "", hitFiles, failures
+    except Exception as e:
+        return groupId, "failed", " ".join(str(e).split()), dict(), dict()
+
+def batchJob(genomeId, genomeFile, genus, outDir, threads, cacheDir, cacheSize, useCache, timeout=None, keepBlast=False, writeHits=True, searchHits=None, searchMode='tblastn'):
+    """Run one genome of a batch in a worker process. Failures are returned
+    instead of raised, so that one genome does not stop the batch.
+
+    Returns:
+        [tuple] -- [genomeId, status ("done"/"failed"), message, start and end time, hit gene ids (query set => ids),
+                    result of runGenome (None for failed genomes)]
+    """
+    start = time.time()
+    try:
+        if(os.path.isdir(outDir)):
+            #partial output of an interrupted run
+            shutil.rmtree(outDir)
+        result = runGenome(genomeFile, genus, outDir, threads, cacheDir, cacheSize, useCache, timeout, keepBlast, writeHits, searchHits, searchMode)
+        return genomeId, "done", "%s %g" % (result['prediction'], result['prediction_score']), start, time.time(), result['hits'], result
+    except Exception as e:
+        return genomeId, "failed", " ".join(str(e).split()), start, time.time(), dict(), None
+
+class PredictionResult(object):
+    """Result of ProBioPredPipeline.predict for one genome
+
+    Attributes:
+        genomeFile {str} -- [genome file name]
+        genus {str} -- [genus of the model]
+        status {str} -- [done or failed]
+        message {str} -- [error message of failed genomes]
+        features {dict} -- [feature => score, in FEATURES order]
+        prediction {str} -- [Probiotic or Non-Probiotic]
+        predictionScore {float} -- [probability of the prediction]
+        probioticProbability {float} -- [probability of the genome being probiotic]
+        hits {dict} -- [query set (pro, vfdb) => sorted hit gene ids]
+        ardbHits {DataFrame} -- [RGI hits contributing to the ARDB score]
+        genomeStats {dict} -- [contigs, length, n50, largest, gc and compressed (see genome.scanGenome)]
+        stages {list} -- [time and resources of the stages (see trace.Trace)]
+    """
+
+    def __init__(self, genomeFile, genus, status="done", message="", result=None, ardbHits=None, stages=()):
+        self.genomeFile = genomeFile
+        self.genus = genus
+        self.status = status
+        self.message = message
+        self.features = dict()
+        self.prediction = self.predictionScore = self.probioticProbability = None
+        self.hits = dict()
+        self.ardbHits = ardbHits
+        self.stages = list(stages)
+        self.genomeStats = dict()
+        for record in self.stages:
+            if(record["name"] == "scan_genome"):
+                self.genomeStats = dict([(k, record[k]) for k in ("compressed", "contigs", "length", "n50", "largest", "gc") if k in record])
+        if(result):
+            self.features = dict([(f, result[f]) for f in mydef.FEATURES])
+            self.prediction, self.predictionScore = result['prediction'], float(result['prediction_score'])
+            self.probioticProbability = self.predictionScore if self.prediction == 'Probiotic' else 1 - self.predictionScore
+            self.hits = result['hits']
+
+    def featureVector(self):
+        """Features in the order of the genus models
+
+        Returns:
+            [list] -- [feature scores]
+        """
+        return [self.features[f] for f in mydef.FEATURES]
+
+    def asDict(self):
+        """Result in the format of runGenome (features, prediction, prediction_score and hits),
+        e.g. for summary.summaryRow. None for failed genomes."""
+        if(self.status != "done"):
+            return None
+        return dict(self.features, prediction=self.prediction, prediction_score=self.predictionScore, hits=self.hits)
+
+class ProBioPredPipeline(object):
+    """Python API for scoring genomes in-process. Scores, feature vectors
+    and predictions are kept in memory; the files of the external tools
+    (queries, RGI output, databases when not cached) are written to a private
+    scratch directory per call, removed when the call returns. Calls do not
+    depend on the current directory and can run concurrently from several
+    threads, e.g. with predictMany.
+
+    Time and peak RSS of the tools in PredictionResult.stages come from
+    getrusage of the whole process, so with concurrent calls cpu_children
+    and peak_rss_children_kb include the tools of the other calls.
+    """
+
+    def __init__(self, threads=1, cacheDir=cache.defaultCacheDir, cacheSize=cache.defaultCacheSize, useCache=True, timeout=None,
+                 searchMode='tblastn', scratchDir=None, keepScratch=False):
+        """
+        Arguments:
+            threads {int} -- [Number of threads to run for BLAST and RGI per genome]
+            cacheDir {str} -- [directory for cached BLAST databases and RGI results]
+            cacheSize {int} -- [size cap of the cache in bytes]
+            useCache {bool} -- [reuse cached BLAST databases and RGI results]
+            timeout {float} -- [seconds after which RGI or BLAST is killed, None for no limit]
+            searchMode {str} -- [tblastn or blastp (see runGenome)]
+            scratchDir {str} -- [parent of the per-call scratch directories, e.g. /dev/shm (Default: system temporary directory)]
+            keepScratch {bool} -- [keep scratch directories, for debugging]
+        """
+        if(searchMode not in mydef.SEARCH_MODES):
+            raise PipelineError("Unsupported search mode : " + str(searchMode))
+        self.threads = int(threads)
+        self.cacheDir = cacheDir
+        self.cacheSize = cacheSize
+        self.useCache = useCache
+        self.timeout = timeout
+        self.searchMode = searchMode
+        self.scratchDir = scratchDir
+        self.keepScratch = keepScratch
+
+    def predict(self, genomeFile, genus, threads=None):
+        """Score one genome
+
+        Arguments:
+            genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+            genus {str} -- [genus of genome, one of GENERA]
+            threads {int} -- [Number of threads for BLAST and RGI (Default: threads of the pipeline)]
+
+        Raises:
+            PipelineError -- [a stage failed]
+
+        Returns:
+            [PredictionResult] -- [features, prediction and hits]
+        """
+        if(genus.lower() not in mydef.GENERA):
+            raise PipelineError("Unsupported genus : " + genus)
+        genomeFile = os.path.abspath(genomeFile.strip())
+        jobDir = tempfile.mkdtemp(prefix="probiopred-job-", dir=self.scratchDir)
+        runTrace = trace.Trace()
+        try:
+            result = _runGenome(genomeFile, [genus.lower()], jobDir, int(threads or self.threads), self.cacheDir, self.cacheSize,
+                                self.useCache, self.timeout, False, False, None, self.searchMode, runTrace,
+                                scratchDir=jobDir, writeResults=False)[genus.lower()]
+            ardbHits = pd.read_csv(os.path.join(jobDir, 'ardb_hits.tsv'), sep='\t')
+            return PredictionResult(genomeFile, genus.lower(), result=result, ardbHits=ardbHits, stages=runTrace.stages)
+        except PipelineError as e:
+            e.stages = runTrace.stages
+            raise
+        finally:
+            if(not self.keepScratch):
+                shutil.rmtree(jobDir, ignore_errors=True)
+
+    def screen(self, genomeFile, genera=mydef.GENERA, threads=None):
+        """Score one genome with the models of several genera, sharing the
+        database, RGI and search work (see screenGenome)
+
+        Arguments:
+            genomeFile {str} -- [genome file name (FASTA, may be gzip/bgzip compressed)]
+            genera {list} -- [genera to score (Default: all GENERA)]
+            threads {int} -- [Number of threads for BLAST and RGI (Default: threads of the pipeline)]
+
+        Raises:
+            PipelineError -- [a shared stage failed]
+
+        Returns:
+            [dict] -- [genus => PredictionResult, with status failed for genera which could not be scored]
+        """
+        genera = list(dict.fromkeys(g.lower() for g in genera))
+        unsupported = [g for g in genera if g not in mydef.GENERA]
+        if(unsupported or not genera):
+            raise PipelineError("Unsupported genus : " + ", ".join(unsupported))
+        genomeFile = os.path.abspath(genomeFile.strip())
+        jobDir = tempfile.mkdtemp(prefix="probiopred-job-", dir=self.scratchDir)
+        runTrace = trace.Trace()
+        try:
+            results = _runGenome(genomeFile, genera, jobDir, int(threads or self.threads), self.cacheDir, self.cacheSize,
+                                 self.useCache, self.timeout, False, False, None, self.searchMode, runTrace,
+                                 scratchDir=jobDir, writeResults=False)
+            ardbHits = pd.read_csv(os.path.join(jobDir, 'ardb_hits.tsv'), sep='\t')
+            return dict([(genus, PredictionResult(genomeFile, genus, "failed", results[genus], stages=runTrace.stages)
+                                 if isinstance(results[genus], str) else
+                                 PredictionResult(genomeFile, genus, result=results[genus], ardbHits=ardbHits, stages=runTrace.stages))
+                         for genus in genera])
+        except PipelineError as e:
+            e.stages = runTrace.stages
+            raise
+        finally:
+            if(not self.keepScratch):
+                shutil.rmtree(jobDir, ignore_errors=True)
+
+    def predictMany(self, genomes, workers=4):
+        """Score genomes concurrently in threads of this process. Failures are
+        returned as results with status failed, so that one genome does not
+        stop the others.
+
+        Arguments:
+            genomes {list} -- [(genome file name, genus) pairs]
+            workers {int} -- [number of genomes scored at a time]
+
+        Returns:
+            [list] -- [PredictionResult of every genome, in input order]
+        """
+        def predictOne(genomeFile, genus):
+            try:
+                return self.predict(genomeFile, genus)
+            except Exception as e:
+                return PredictionResult(genomeFile, genus.lower(), "failed", " ".join(str(e).split()), stages=getattr(e, "stages", ()))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            return list(executor.map(lambda g: predictOne(*g), genomes))
@@ -0,0 +1,146 @@
+import os
+import threading
+from probiopred import cache
+
+_stores = dict()
+_storesLock = threading.Lock()
+
+class ProteinStore(object):
+    """Random access to the sequences of a reference protein multifasta file.
+
+    The byte offset of every sequence is kept in an index file (<fasta>.idx,
+    or in the cache directory when the data directory is not writable), which
+    is built once and rebuilt only when the fasta file changes. Sequences are
+    read with os.pread, so one store can be shared between threads.
+    """
+
+    def __init__(self, fastaFile, indexFile=None):
+        """
+        Arguments:
+            fastaFile {str} -- [reference multifasta file name]
+            indexFile {str} -- [index file name (Default: <fasta>.idx)]
+        """
+        self.fastaFile = os.path.abspath(fastaFile)
+        self.indexFile = indexFile or self.fastaFile + ".idx"
+        stat = os.stat(self.fastaFile)
+        self.stamp = "%d\t%d" % (stat.st_size, stat.st_mtime_ns)
+        self.index = self._readIndex()
+        if(self.index is None):
+            self.index = self._buildIndex()
+            self._writeIndex()
+        self.fd = os.open(self.fastaFile, os.O_RDONLY)
+
+    def _readIndex(self):
+        """Read index file if it exists and matches the fasta file"""
+        for indexFile in self._indexFiles():
+            try:
+                with open(indexFile, "r") as f:
+                    if(f.readline().rstrip("\n") != "#probiopred-index\t" + self.stamp):
+                        continue
+                    index = dict()
+                    for line in f:
+                        seqId, offset, length = line.rstrip("\n").split("\t")
+                        index[seqId] = (int(offset), int(length))
+                    return index
+            except (IOError, ValueError):
+                continue
+        return None
+
+    def _buildIndex(self):
+        """Scan fasta file once: id => (offset of sequence, length in bytes)"""
+        index = dict()
+        seqId, start, pos = None, 0, 0
+        with open(self.fastaFile, "rb") as f:
+            for line in f:
+                if(line.startswith(b">")):
+                    if(seqId is not None):
+                        index[seqId] = (start, pos - start)
+                    seqId = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+                    start = pos + len(line)
+                pos += len(line)
+        if(seqId is not None):
+            index[seqId] = (start, pos - start)
+        return index
+
+    def _indexFiles(self):
+        """Index file locations: beside the fasta file, then in the cache directory"""
+        yield self.indexFile
+        yield os.path.join(cache.defaultCacheDir, "refindex", cache.contentHash(self.fastaFile)[:16] + ".idx")
+
+    def _writeIndex(self):
+        """Write index beside the fasta file, or in the cache directory"""
+        for indexFile in self._indexFiles():
+            try:
+                os.makedirs(os.path.dirname(indexFile), exist_ok=True)
+                with open(indexFile + ".tmp", "w") as out:
+                    out.write("#probiopred-index\t" + self.stamp + "\n")
+                    for seqId, (offset, length) in self.index.items():
+                        out.write("%s\t%d\t%d\n" % (seqId, offset, length))
+                os.replace(indexFile + ".tmp", indexFile)
+                return
+            except OSError:
+                continue
+
+    def __contains__(self, seqId):
+        return seqId in self.index
+
+    def sequence(self, seqId):
+        """Sequence of id (KeyError if not in file)
+
+        Arguments:
+            seqId {str} -- [sequence id]
+
+        Returns:
+            [str] -- [sequence]
+        """
+        offset, length = self.index[seqId]
+        return "".join(os.pread(self.fd, length, offset).decode().split())
+
+    def write(self, idList, out, prefix=""):
+        """Write sequences of ids present in the store, in file order
+
+        Arguments:
+            idList {iterable} -- [ids to write]
+            out {file} -- [open output file]
+            prefix {str} -- [prefix added to written ids]
+        """
+        for seqId in sorted(set(i for i in idList if i in self.index), key=lambda i: self.index[i][0]):
+            out.write(">" + prefix + seqId + "\n" + self.sequence(seqId) + "\n")
+
+    def extract(self, idList, outFile):
+        """Write sequences of ids to outFile (same output as extractSeq)
+
+        Arguments:
+            idList {iterable} -- [ids to extract]
+            outFile {str} -- [Name of output file]
+        """
+        with open(outFile, "w") as out:
+            self.write(idList, out)
+
+    def extractBatch(self, idsByGenome, outFile, mode="w"):
+        """Write hit sequences of many genomes to one file, ids tagged as
+        <genome>__<id>
+
+        Arguments:
+            idsByGenome {dict} -- [genome => ids]
+            outFile {str} -- [Name of output file]
+            mode {str} -- ["w" to overwrite or "a" to append]
+        """
+        with open(outFile, mode) as out:
+            for genome, idList in idsByGenome.items():
+                self.write(idList, out, str(genome) + "__")
+
+def loadStore(fastaFile):
+    """Return store of reference file, opened once per process
+
+    Arguments:
+        fastaFile {str} -- [reference multifasta file name]
+
+    Returns:
+        [ProteinStore] -- [store]
+    """
+    fastaFile = os.path.abspath(fastaFile)
+    with _storesLock:
+        if(fastaFile not in _stores):
+            _stores[fastaFile] = ProteinStore(fastaFile)
+        return _stores[fastaFile]
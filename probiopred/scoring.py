@@ -0,0 +1,370 @@
+import os
+import re
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+baseDir = os.path.dirname(os.path.abspath( __file__ ))
+aroWeightsFile = os.path.join(baseDir, "data", "rgi", "aro_weights.tsv")
+categoryFile = os.path.join(baseDir, "data", "pro", "Genes_Category.txt")
+
+#feature order used for training the genus models
+CATEGORIES = 'resistance_acid resistance_bile adherance competitive persistance hydrolyze_bile_salt biofilm growth adaption osmotic anti_bactrial immune_modulation simulated_gastricjuice'.split()
+FEATURES = ['ardb', 'vfdb'] + CATEGORIES
+
+#RGI hits with identity above this are scored
+RGI_MIN_IDENTITY = 80
+
+#BLAST hits are kept with pident, qcovs and bitscore above these
+BLAST_MIN_PIDENT = 60
+BLAST_MIN_QCOVS = 60
+BLAST_MIN_BITSCORE = 50
+
+_aroWeights = None
+_categoryIndex = None
+_loadLock = threading.RLock()
+
+def loadAROWeights():
+    """ARO accession => ARDB weight index, read once per process. The weight
+    of an accession is the sum of its ARDB categories (1-4).
+
+    Returns:
+        [Series] -- [weights indexed by ARO accession]
+    """
+    global _aroWeights
+    with _loadLock:
+        if(_aroWeights is None):
+            df = pd.read_csv(aroWeightsFile, sep="\t", dtype={"ARO": str, "categories": str, "weight": int})
+            _aroWeights = df.set_index("ARO")["weight"]
+        return _aroWeights
+
+def rgiScoringKey():
+    """Identifies the ARDB scoring (ARO weights and identity threshold), so
+    that cached scores are recomputed when either changes
+
+    Returns:
+        [str] -- [key]
+    """
+    with open(aroWeightsFile, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16] + "-%g" % RGI_MIN_IDENTITY
+
+def readRGITable(rgiOutFile):
+    """Read the columns of RGI tab-delimited output needed for scoring
+
+    Arguments:
+        rgiOutFile {str} -- [RGI output (txt)]
+
+    Returns:
+        [DataFrame] -- [columns Best_Identities and ARO]
+    """
+    try:
+        df = pd.read_csv(rgiOutFile, sep="\t", usecols=[9, 10], dtype=str)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=["Best_Identities", "ARO"])
+    df.columns = ["Best_Identities", "ARO"]
+    return df
+
+def rgiHits(rgiTables):
+    """Score RGI outputs of one or many genomes in one columnar pass
+
+    Arguments:
+        rgiTables {str/DataFrame/dict} -- [RGI output file or table, or dict of genome => file or table]
+
+    Returns:
+        [DataFrame] -- [contributing hits with columns genome, ARO, Best_Identities and weight]
+    """
+    if(not isinstance(rgiTables, dict)):
+        rgiTables = {None: rgiTables}
+    frames = []
+    for genome, table in rgiTables.items():
+        if(not isinstance(table, pd.DataFrame)):
+            table = readRGITable(table)
+        frames.append(table[["Best_Identities", "ARO"]].assign(genome=genome))
+    if(not frames):
+        return pd.DataFrame(columns=["genome", "ARO", "Best_Identities", "weight"])
+    df = pd.concat(frames, ignore_index=True)
+    df["ARO"] = df["ARO"].astype(str).str.strip()
+    df["Best_Identities"] = pd.to_numeric(df["Best_Identities"], errors="coerce")
+    df = df.loc[df["Best_Identities"] > RGI_MIN_IDENTITY]
+    df = df.assign(weight=df["ARO"].map(loadAROWeights()))
+    df = df.loc[df["weight"].notna()].astype({"weight": int})
+    return df[["genome", "ARO", "Best_Identities", "weight"]].reset_index(drop=True)
+
+def rgiScores(rgiTables):
+    """ARDB scores of one or many genomes
+
+    Arguments:
+        rgiTables {dict} -- [genome => RGI output file or table]
+
+    Returns:
+        [Series] -- [ARDB score indexed by genome (0 for genomes without scored hits)]
+    """
+    hits = rgiHits(rgiTables)
+    return hits.groupby("genome")["weight"].sum().reindex(list(rgiTables), fill_value=0).astype(int)
+
+class CategoryIndex(object):
+    """Gene x category incidence matrix of the probiotic categories
+
+    Attributes:
+        genes {list} -- [gene ids, row order of matrix]
+        geneIndex {dict} -- [gene id => row]
+        matrix {array} -- [gene x category incidence (0/1), columns ordered as CATEGORIES]
+    """
+
+    def __init__(self, categoryFile):
+        """Read category gene lists (name = qw('gene1 gene2 ...'))
+
+        Arguments:
+            categoryFile {str} -- [category file name]
+        """
+        lists = dict()
+        with open(categoryFile, "r") as f:
+            for line in f:
+                m = re.match(r"\s*(\w+)\s*=\s*qw\('([^']*)'\)", line)
+                if(m):
+                    lists[m.group(1)] = m.group(2).split()
+        missing = [c for c in CATEGORIES if c not in lists]
+        if(missing):
+            raise ValueError(categoryFile + " : missing categories " + ", ".join(missing))
+        self.genes = sorted(set(g for c in CATEGORIES for g in lists[c]))
+        self.geneIndex = dict([(g, i) for i, g in enumerate(self.genes)])
+        self.matrix = np.zeros((len(self.genes), len(CATEGORIES)))
+        for j, c in enumerate(CATEGORIES):
+            for g in set(lists[c]):
+                self.matrix[self.geneIndex[g], j] = 1
+
+def loadCategories():
+    """Category incidence index, built once per process
+
+    Returns:
+        [CategoryIndex] -- [gene x category incidence]
+    """
+    global _categoryIndex
+    with _loadLock:
+        if(_categoryIndex is None):
+            _categoryIndex = CategoryIndex(categoryFile)
+        return _categoryIndex
+
+def readHitTable(blastOutFile):
+    """Read query id and identity columns of BLAST outfmt 6 file
+
+    Arguments:
+        blastOutFile {str} -- [BLAST output filename]
+
+    Returns:
+        [DataFrame] -- [columns qseqid and pident]
+    """
+    try:
+        return pd.read_csv(blastOutFile, sep="\t", header=None, usecols=[0, 2], names=["qseqid", "pident"],
+                           dtype={"qseqid": str, "pident": float})
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame({"qseqid": pd.Series(dtype=str), "pident": pd.Series(dtype=float)})
+
+def _hitFrame(hitTables):
+    """Concatenate hit tables of genomes into one frame with genome and row
+    (position of genome in hitTables) columns"""
+    frames = []
+    for row, (genome, table) in enumerate(hitTables.items()):
+        if(not isinstance(table, pd.DataFrame)):
+            table = readHitTable(table)
+        frames.append(pd.DataFrame({"genome": genome, "row": row, "qseqid": table.iloc[:, 0].astype(str), "pident": table["pident"].astype(float)}))
+    if(not frames):
+        return pd.DataFrame(columns=["genome", "row", "qseqid", "pident"])
+    return pd.concat(frames, ignore_index=True)
+
+def categoryScores(hitTables):
+    """Probiotic category scores: for every category the sum of pident/100 of
+    the filtered hits of its genes. Computed as one product of the
+    genome x gene identity matrix with the gene x category incidence.
+
+    Arguments:
+        hitTables {str/DataFrame/dict} -- [filtered BLAST output file or table (qseqid, pident), or dict of genome => file or table]
+
+    Returns:
+        [DataFrame] -- [genome x category scores]
+    """
+    if(not isinstance(hitTables, dict)):
+        hitTables = {None: hitTables}
+    index = loadCategories()
+    genomes = list(hitTables)
+    hits = _hitFrame(hitTables)
+    rows = hits["row"].to_numpy(dtype=int)
+    cols = hits["qseqid"].map(index.geneIndex)
+    known = cols.notna().to_numpy()
+    identity = np.zeros((len(genomes), len(index.genes)))
+    np.add.at(identity, (rows[known], cols[known].astype(int).to_numpy()), hits["pident"].to_numpy()[known] / 100)
+    return pd.DataFrame(identity.dot(index.matrix), index=genomes, columns=CATEGORIES)
+
+def featureMatrix(proHitTables, vfdbHitTables=None, ardbScores=None):
+    """Genome x feature matrix in the feature order of the models
+
+    Arguments:
+        proHitTables {dict} -- [genome => filtered probiotic BLAST output file or table]
+        vfdbHitTables {dict} -- [genome => filtered virulence BLAST output file or table (vfdb = number of hits)]
+        ardbScores {dict/Series} -- [genome => ARDB score]
+
+    Returns:
+        [DataFrame] -- [genome x FEATURES]
+    """
+    features = categoryScores(proHitTables)
+    features["vfdb"] = 0
+    if(vfdbHitTables):
+        vfdb = _hitFrame(vfdbHitTables).groupby("genome", dropna=False).size()
+        features["vfdb"] = vfdb.reindex(features.index, fill_value=0)
+    features["ardb"] = 0
+    if(ardbScores is not None):
+        features["ardb"] = pd.Series(ardbScores).reindex(features.index, fill_value=0)
+    return features[FEATURES]
+
+class HitCollector(object):
+    """Incremental parser of tabular tblastn output (outfmt 6 qseqid sseqid
+    pident qcovs ...) of a search with tagged queries (see combineQueries).
+    Lines are filtered with the BLAST_MIN_* thresholds as they arrive, so the
+    search output never has to be written and read back.
+
+    Attributes:
+        hits {dict} -- [tag => list of (gene id, pident) of filtered hits]
+        bytesRead {int} -- [size of the parsed output]
+    """
+
+    def __init__(self, tags, filteredFiles=None):
+        """
+        Arguments:
+            tags {list} -- [query set tags, e.g. pro and vfdb]
+            filteredFiles {dict} -- [tag => file name to write the filtered hits to (optional)]
+        """
+        self.hits = dict([(tag, []) for tag in tags])
+        self.outs = dict([(tag, open(f, "w")) for tag, f in (filteredFiles or {}).items()])
+        self.bytesRead = 0
+
+    def addLine(self, line):
+        """Parse one output line (str or bytes)
+
+        Raises:
+            ValueError -- [malformed line]
+        """
+        self.bytesRead += len(line)
+        if(isinstance(line, bytes)):
+            line = line.decode()
+        fields = line.rstrip("\n").split("\t")
+        if(len(fields) < 8):
+            if(line.strip()):
+                raise ValueError("Malformed BLAST output line : " + line.strip())
+            return
+        tag, sep, gene = fields[0].partition("__")
+        if(not sep or tag not in self.hits):
+            raise ValueError("Untagged BLAST query id : " + fields[0])
+        pident, qcovs, bitscore = float(fields[2]), float(fields[3]), float(fields[7])
+        if(pident > BLAST_MIN_PIDENT and qcovs > BLAST_MIN_QCOVS and bitscore > BLAST_MIN_BITSCORE):
+            self.hits[tag].append((gene, pident))
+            if(tag in self.outs):
+                self.outs[tag].write(gene + "\t" + "\t".join(fields[1:]) + "\n")
+
+    def close(self):
+        """Close filtered hit files"""
+        for out in self.outs.values():
+            out.close()
+        self.outs = dict()
+
+    def count(self, tag):
+        """Number of filtered hits of query set"""
+        return len(self.hits[tag])
+
+    def genes(self, tag):
+        """Set of genes with filtered hits in query set"""
+        return set(gene for gene, pident in self.hits[tag])
+
+    def table(self, tag):
+        """Filtered hits of query set as table (qseqid, pident)"""
+        return pd.DataFrame(self.hits[tag], columns=["qseqid", "pident"])
+
+class QueryDispatcher(object):
+    """Passes output lines of a search with the query union of several
+    genera (see combineGenusQueries) to the HitCollector of every genus the
+    query belongs to, with the query id restored to tag__gene.
+
+    Attributes:
+        bytesRead {int} -- [size of the parsed output]
+    """
+
+    def __init__(self, queryMap, collectors):
+        """
+        Arguments:
+            queryMap {dict} -- [query id => list of (genus, tagged id)]
+            collectors {dict} -- [genus => HitCollector]
+        """
+        self.queryMap = queryMap
+        self.collectors = collectors
+        self.bytesRead = 0
+
+    def addLine(self, line):
+        """Route one output line (str or bytes) to the collectors of its genera
+
+        Raises:
+            ValueError -- [unknown query id or malformed line]
+        """
+        self.bytesRead += len(line)
+        if(isinstance(line, bytes)):
+            line = line.decode()
+        queryId, sep, rest = line.partition("\t")
+        if(not sep):
+            if(line.strip()):
+                raise ValueError("Malformed BLAST output line : " + line.strip())
+            return
+        if(queryId not in self.queryMap):
+            raise ValueError("Unknown BLAST query id : " + queryId)
+        for genus, taggedId in self.queryMap[queryId]:
+            self.collectors[genus].addLine(taggedId + "\t" + rest)
+
+    def close(self):
+        """Close the collectors"""
+        for collector in self.collectors.values():
+            collector.close()
+
+class HitDemultiplexer(object):
+    """Splits tabular tblastn output of a multi-genome database (see
+    combineGenomes) into per-genome hit files. For every genome and query,
+    only the lines of the best subject sequence (the first one reported) are
+    kept, as a search of the genome alone with -max_target_seqs 1 would
+    report. Subject ids are restored to the original contig ids; the
+    thresholds are applied when the files are read with HitCollector.
+    """
+
+    def __init__(self, seqGenomes, outFiles):
+        """
+        Arguments:
+            seqGenomes {dict} -- [database sequence id => (genome id, contig id)]
+            outFiles {dict} -- [genome id => file name for its hits]
+        """
+        self.seqGenomes = seqGenomes
+        self.outs = dict([(genome, open(f, "w")) for genome, f in outFiles.items()])
+        self.best = dict()
+
+    def addLine(self, line):
+        """Route one output line (str or bytes) to the file of its genome
+
+        Raises:
+            ValueError -- [malformed line or unknown subject id]
+        """
+        if(isinstance(line, bytes)):
+            line = line.decode()
+        fields = line.rstrip("\n").split("\t")
+        if(len(fields) < 8):
+            if(line.strip()):
+                raise ValueError("Malformed BLAST output line : " + line.strip())
+            return
+        seqId = fields[1].split("|")[-1]
+        if(seqId not in self.seqGenomes):
+            raise ValueError("Unknown BLAST subject id : " + fields[1])
+        genome, contig = self.seqGenomes[seqId]
+        if(self.best.setdefault((genome, fields[0]), seqId) != seqId or genome not in self.outs):
+            return
+        fields[1] = contig
+        self.outs[genome].write("\t".join(fields) + "\n")
+
+    def close(self):
+        """Close hit files"""
+        for out in self.outs.values():
+            out.close()
+        self.outs = dict()
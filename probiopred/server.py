@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+import numpy as np
+import probiopred.probiopred as mydef
+from probiopred import pipeline
+from probiopred import scoring
+from probiopred import refstore
+from probiopred import svm
+
+#finished jobs kept for status queries
+MAX_FINISHED_JOBS = 10000
+
+def warmUp():
+    """Load genus models, category and ARO tables, reference protein stores
+    and RGI versions into this process, so that forked workers start with them.
+    """
+    for genus in mydef.GENERA:
+        proFile, vfdbFile, model = mydef.readInput(genus)
+        svm.loadModel(model)
+        for referenceFile in (proFile, vfdbFile):
+            if(os.path.isfile(referenceFile)):
+                refstore.loadStore(referenceFile)
+    scoring.loadAROWeights()
+    scoring.loadCategories()
+    #key of the RGI result cache
+    mydef.rgiVersion()
+
+def _initWorker():
+    """Worker start up: leave Ctrl-C to the server, which shuts the pool down"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warmUp()
+
+def _jsonable(value):
+    """Convert numpy scalars in results to plain python values"""
+    if(isinstance(value, dict)):
+        return dict([(k, _jsonable(v)) for k, v in value.items()])
+    if(isinstance(value, (list, tuple))):
+        return [_jsonable(v) for v in value]
+    if(isinstance(value, np.generic)):
+        return value.item()
+    return value
+
+def scoreJob(genomeFile, genus, outDir, threads, cacheDir, cacheSize, useCache, timeout, searchMode='tblastn'):
+    """Run one genome in a worker process. Failures are returned instead of
+    raised, so that the worker stays alive for the next job.
+
+    Returns:
+        [tuple] -- [status ("done"/"failed"), result dict or error message, start and end time]
+    """
+    start = time.time()
+    try:
+        result = pipeline.runGenome(genomeFile, genus, outDir, threads, cacheDir, cacheSize, useCache, timeout, searchMode=searchMode)
+        return "done", _jsonable(result), start, time.time()
+    except Exception as e:
+        return "failed", " ".join(str(e).split()), start, time.time()
+
+class JobQueue(object):
+    """Genome scoring jobs queued onto a pool of warm worker processes"""
+
+    def __init__(self, workers, threads, workDir, cacheDir, cacheSize, useCache=True, timeout=None, searchMode='tblastn'):
+        """
+        Arguments:
+            workers {int} -- [number of genomes scored concurrently]
+            threads {int} -- [default BLAST/RGI threads per genome]
+            workDir {str} -- [directory for per-job outputs]
+            cacheDir {str} -- [directory for cached BLAST databases]
+            cacheSize {int} -- [size cap of the cache in bytes]
+            useCache {bool} -- [reuse cached BLAST databases]
+            timeout {float} -- [seconds after which RGI or tblastn is killed]
+            searchMode {str} -- [default search program, tblastn or blastp (see runGenome)]
+        """
+        self.threads = threads
+        self.searchMode = searchMode
+        self.workDir = os.path.abspath(workDir)
+        self.cacheDir = cacheDir
+        self.cacheSize = cacheSize
+        self.useCache = useCache
+        self.timeout = timeout
+        self.jobs = dict()
+        self.lock = threading.Lock()
+        os.makedirs(self.workDir, exist_ok=True)
+        warmUp()
+        #forked workers start with the warm models and tables of this process;
+        #start them now, before the server threads exist
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                            initializer=_initWorker)
+        for future in [self.executor.submit(time.sleep, 0.1) for i in range(workers)]:
+            future.result()
+
+    def submit(self, request):
+        """Queue a genome scoring job
+
+        Arguments:
+            request {dict} -- [genome (path), genus, optional id, output_dir (inside workDir), threads and search_mode]
+
+        Returns:
+            [dict] -- [job status]
+        """
+        if(not isinstance(request, dict)):
+            raise ValueError("job must be a JSON object")
+        genomeFile = request.get("genome")
+        genus = str(request.get("genus", "")).lower()
+        if(not genomeFile or not os.path.isfile(genomeFile)):
+            raise ValueError("genome must be an existing FASTA file path")
+        if(genus not in mydef.GENERA):
+            raise ValueError("genus must be one of " + ", ".join(mydef.GENERA))
+        searchMode = request.get("search_mode") or self.searchMode
+        if(searchMode not in mydef.SEARCH_MODES):
+            raise ValueError("search_mode must be one of " + ", ".join(mydef.SEARCH_MODES))
+        threads = request.get("threads")
+        if(threads is None):
+            threads = self.threads
+        elif(isinstance(threads, bool) or not re.fullmatch(r"[0-9]+", str(threads)) or int(threads) < 1):
+            raise ValueError("threads must be a positive integer")
+        jobId = str(request.get("id") or uuid.uuid4().hex)
+        #the id names the output directory of the job
+        if(not re.fullmatch(r"[A-Za-z0-9_.-]+", jobId) or ".." in jobId or not jobId.strip(".")):
+            raise ValueError("id must only contain letters, digits, '_', '-' and single '.', and not only '.'")
+        #outputs stay inside the work directory, relative output_dir are taken from it
+        workDir = os.path.realpath(self.workDir)
+        outDir = os.path.realpath(os.path.join(workDir, str(request.get("output_dir") or jobId)))
+        if(not outDir.startswith(workDir + os.sep)):
+            raise ValueError("output_dir must be a directory inside " + workDir)
+        job = dict(id=jobId, genome=os.path.abspath(genomeFile), genus=genus, output_dir=outDir,
+                   status="queued", submitted=time.time())
+        with self.lock:
+            if(jobId in self.jobs and self.jobs[jobId]["status"] in ("queued", "running")):
+                raise ValueError("job " + jobId + " is already queued")
+            #the job is only visible with its future, see status
+            job["future"] = self.executor.submit(scoreJob, job["genome"], genus, job["output_dir"],
+                                                 int(threads), self.cacheDir, self.cacheSize,
+                                                 self.useCache, self.timeout, searchMode)
+            self.jobs[jobId] = job
+            future = job["future"]
+        #outside the lock, the callback of a job which already finished runs right away and takes the lock
+        future.add_done_callback(lambda f: self._finished(jobId, f))
+        return self.status(jobId)
+
+    def _finished(self, jobId, future):
+        """Store result of finished job"""
+        with self.lock:
+            job = self.jobs.get(jobId)
+            if(job is None):
+                return
+            try:
+                status, result, start, end = future.result()
+                job.update(status=status, started=start, finished=end)
+                if(status == "done"):
+                    job["result"] = result
+                else:
+                    job["message"] = result
+            except Exception as e:
+                job.update(status="failed", message=str(e), finished=time.time())
+            finished = [j for j in self.jobs.values() if j["status"] in ("done", "failed")]
+            for old in sorted(finished, key=lambda j: j["finished"])[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[old["id"]]
+
+    def status(self, jobId):
+        """Job status (with result when done) or None for unknown job"""
+        with self.lock:
+            job = self.jobs.get(jobId)
+            if(job is None):
+                return None
+            if(job["status"] == "queued" and job["future"].running()):
+                job["status"] = "running"
+            return _jsonable(dict([(k, v) for k, v in job.items() if k != "future"]))
+
+    def wait(self, jobId, timeout=None):
+        """Wait for job to finish and return its status"""
+        with self.lock:
+            future = self.jobs[jobId]["future"]
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+        #done callback may still be storing the result
+        for i in range(100):
+            if(self.status(jobId)["status"] in ("done", "failed")):
+                break
+            time.sleep(0.01)
+        return self.status(jobId)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+def makeHandler(queue):
+    """HTTP request handler class serving the job queue
+
+    GET  /health          -- server status
+    POST /jobs            -- queue job, JSON body {"genome": path, "genus": name, ...}
+    POST /jobs?wait=1     -- queue job and wait for its result
+    GET  /jobs/<id>       -- job status and result
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split("?")[0].rstrip("/")
+            if(path == "/health"):
+                with queue.lock:
+                    counts = dict()
+                    for job in queue.jobs.values():
+                        counts[job["status"]] = counts.get(job["status"], 0) + 1
+                self._reply(200, dict(status="ok", genera=mydef.GENERA, jobs=counts))
+            elif(path.startswith("/jobs/")):
+                job = queue.status(path[len("/jobs/"):])
+                if(job is None):
+                    self._reply(404, dict(error="unknown job"))
+                else:
+                    self._reply(200, job)
+            else:
+                self._reply(404, dict(error="not found"))
+
+        def do_POST(self):
+            path, _, query = self.path.partition("?")
+            if(path.rstrip("/") != "/jobs"):
+                self._reply(404, dict(error="not found"))
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                job = queue.submit(request)
+            except ValueError as e:
+                self._reply(400, dict(error=str(e)))
+                return
+            if("wait=1" in query.split("&")):
+                job = queue.wait(job["id"])
+            self._reply(202 if job["status"] in ("queued", "running") else 200, job)
+
+        def address_string(self):
+            #unix socket clients have no address
+            return self.client_address[0] if self.client_address else "unix"
+
+    return Handler
+
+class UnixHTTPServer(ThreadingUnixStreamServer):
+    """HTTP server listening on a unix socket"""
+    daemon_threads = True
+
+    def server_bind(self):
+        if(os.path.exists(self.server_address)):
+            os.remove(self.server_address)
+        ThreadingUnixStreamServer.server_bind(self)
+        self.server_name = socket.gethostname()
+        self.server_port = 0
+
+def serve(queue, host="127.0.0.1", port=8765, unixSocket=None):
+    """Serve job queue over HTTP on localhost or a unix socket until interrupted
+
+    Arguments:
+        queue {JobQueue} -- [job queue]
+        host {str} -- [address to listen on]
+        port {int} -- [port to listen on]
+        unixSocket {str} -- [unix socket path, used instead of host and port]
+    """
+    if(unixSocket):
+        httpd = UnixHTTPServer(unixSocket, makeHandler(queue))
+    else:
+        httpd = ThreadingHTTPServer((host, port), makeHandler(queue))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        queue.shutdown()
+        if(unixSocket and os.path.exists(unixSocket)):
+            os.remove(unixSocket)
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+class StageError(Exception):
+    """Raised when an external stage times out"""
+
+class Stage(object):
+    """External command run as one stage of the pipeline
+
+    Arguments:
+        name {str} -- [stage name]
+        cmd {list} -- [command and arguments]
+        timeout {float} -- [seconds after which the command is killed, None for no limit]
+        onStdout {function} -- [called with every stdout line (bytes), otherwise stdout is kept]
+        stdin {iterable} -- [bytes chunks written to the command's stdin, None for no input]
+
+    Attributes:
+        start, end {float} -- [time the command was started and reaped (set by runStages)]
+    """
+
+    def __init__(self, name, cmd, timeout=None, onStdout=None, stdin=None):
+        self.name = name
+        self.cmd = [str(i) for i in cmd]
+        self.timeout = timeout
+        self.onStdout = onStdout
+        self.stdin = stdin
+        self.start = self.end = None
+
+async def _drain(stream, onLine):
+    """Read stream until EOF, passing lines to onLine or collecting them"""
+    lines = []
+    async for line in stream:
+        if(onLine):
+            onLine(line)
+        else:
+            lines.append(line)
+    return lines
+
+async def _feed(stream, chunks):
+    """Write chunks to stream and close it"""
+    try:
+        for chunk in chunks:
+            stream.write(chunk)
+            await stream.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        #the command exited early, its return code and stderr tell why
+        pass
+    finally:
+        stream.close()
+
+async def _runStage(stage):
+    """Run one stage, draining stdout and stderr concurrently so that verbose
+    tools never block on a full pipe.
+
+    Returns:
+        [tuple] -- [return code, stdout lines, stderr lines (return code 127 if the command cannot be started)]
+    """
+    stage.start = time.time()
+    try:
+        proc = await asyncio.create_subprocess_exec(*stage.cmd, stdin=asyncio.subprocess.DEVNULL if stage.stdin is None else asyncio.subprocess.PIPE,
+                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                    limit=1 << 24)
+    except OSError as e:
+        #command not found or not executable, failed like the shell reports it
+        stage.end = time.time()
+        return 127, [], [("%s : %s" % (stage.cmd[0], e.strerror or e)).encode()]
+    try:
+        feed = [] if stage.stdin is None else [_feed(proc.stdin, stage.stdin)]
+        stdout, stderr = (await asyncio.wait_for(asyncio.gather(_drain(proc.stdout, stage.onStdout),
+                                                                _drain(proc.stderr, None), *feed), stage.timeout))[:2]
+        await proc.wait()
+    except asyncio.TimeoutError:
+        raise StageError(stage.name + " timed out after %g s" % stage.timeout)
+    finally:
+        if(proc.returncode is None):
+            proc.kill()
+            await proc.wait()
+        stage.end = time.time()
+    return proc.returncode, stdout, stderr
+
+async def _runAll(stages):
+    tasks = [asyncio.ensure_future(_runStage(s)) for s in stages]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        #one stage failed, stop the others
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def runStages(stages):
+    """Run stages concurrently and wait for all of them
+
+    Arguments:
+        stages {list} -- [list of Stage]
+
+    Returns:
+        [dict] -- [stage name => (return code, stdout lines, stderr lines)]
+    """
+    results = asyncio.run(_runAll(stages))
+    return dict([(s.name, r) for s, r in zip(stages, results)])
+
+def checkResponse(result):
+    """Convert stage result to the flags used in the pipeline
+
+    Arguments:
+        result {tuple} -- [return code, stdout lines, stderr lines]
+
+    Returns:
+        [boolean] -- [True if succeeded or stderr lines]
+    """
+    returncode, stdout, stderr = result
+    if(returncode == 0 and len(stderr) == 0):
+        return True
+    return [line.decode(errors="replace") for line in stderr] or ["exit status %d" % returncode]
@@ -0,0 +1,174 @@
+import os
+import time
+import pandas as pd
+from probiopred import scoring
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+#run metadata, features and prediction of every genome of a batch
+COLUMNS = ['genomeID', 'genus', 'genomeFile', 'status', 'message', 'start', 'end', 'wall'] + scoring.FEATURES + \
+          ['prediction', 'prediction_score', 'probiotic_probability', 'pro_hits', 'vfdb_hits']
+STRING_COLUMNS = ['genomeID', 'genus', 'genomeFile', 'status', 'message', 'prediction']
+INT_COLUMNS = ['pro_hits', 'vfdb_hits']
+
+STREAM_FILE = 'summary.arrows'
+PARQUET_FILE = 'summary.parquet'
+TSV_FILE = 'summary_result.tsv'
+
+def _schema():
+    return pa.schema([(c, pa.string() if c in STRING_COLUMNS else pa.int64() if c in INT_COLUMNS else pa.float64())
+                      for c in COLUMNS])
+
+def summaryRow(genomeId, genus, genomeFile, status, message, start, end, result=None):
+    """Summary row of one genome
+
+    Arguments:
+        genomeId {str} -- [genome id]
+        genus {str} -- [genus]
+        genomeFile {str} -- [genome file name]
+        status {str} -- [done or failed]
+        message {str} -- [prediction or error message]
+        start {float} -- [start time (epoch seconds)]
+        end {float} -- [end time (epoch seconds)]
+        result {dict} -- [features, prediction, prediction_score and hits (see runGenome), None for failed genomes]
+
+    Returns:
+        [dict] -- [row with COLUMNS]
+    """
+    row = dict([(c, None) for c in COLUMNS])
+    row.update(genomeID=genomeId, genus=genus, genomeFile=genomeFile, status=status, message=message,
+               start=start, end=end, wall=end - start)
+    if(result):
+        row.update([(c, float(result[c])) for c in scoring.FEATURES + ['prediction_score']])
+        row['prediction'] = result['prediction']
+        if(result['prediction'] == 'Probiotic'):
+            row['probiotic_probability'] = row['prediction_score']
+        else:
+            row['probiotic_probability'] = 1 - row['prediction_score']
+        for tag, genes in result.get('hits', dict()).items():
+            row[tag + '_hits'] = len(genes)
+    return row
+
+def readSummary(outDir):
+    """Read summary of a batch, also while it is being written
+
+    Arguments:
+        outDir {str} -- [batch output directory]
+
+    Returns:
+        [DataFrame] -- [summary rows (COLUMNS), empty if there is no summary]
+    """
+    streamFile, tsvFile = os.path.join(outDir, STREAM_FILE), os.path.join(outDir, TSV_FILE)
+    if(pa is not None and os.path.isfile(streamFile)):
+        batches = []
+        try:
+            with pa.OSFile(streamFile, 'rb') as f:
+                for batch in pa.ipc.open_stream(f):
+                    batches.append(batch)
+        except (pa.ArrowInvalid, OSError):
+            #stream cut at a batch being written
+            pass
+        return pa.Table.from_batches(batches, _schema()).to_pandas()
+    if(os.path.isfile(tsvFile)):
+        df = pd.read_csv(tsvFile, sep='\t', dtype={'genomeID': str})
+        if(list(df.columns) == COLUMNS):
+            return df
+    return pd.DataFrame(columns=COLUMNS)
+
+class SummaryWriter(object):
+    """Batch summary written as genomes finish: an Arrow IPC stream
+    (summary.arrows) flushed in small record batches, which can be read with
+    readSummary during the run and is converted to summary.parquet and
+    summary_result.tsv by close(). Without pyarrow, rows are appended to
+    summary_result.tsv.
+    """
+
+    def __init__(self, outDir, previous=None, flushRows=16, flushSeconds=10):
+        """
+        Arguments:
+            outDir {str} -- [batch output directory]
+            previous {DataFrame} -- [rows of genomes finished in an earlier run, written first]
+            flushRows {int} -- [rows per record batch]
+            flushSeconds {float} -- [flush rows at least this often]
+        """
+        self.outDir = outDir
+        self.flushRows = flushRows
+        self.flushSeconds = flushSeconds
+        self.rows = []
+        self.lastFlush = time.time()
+        if(pa is not None):
+            self.sink = pa.OSFile(os.path.join(outDir, STREAM_FILE), 'wb')
+            self.writer = pa.ipc.new_stream(self.sink, _schema())
+        else:
+            self.writer = None
+            self.sink = open(os.path.join(outDir, TSV_FILE), 'w')
+            self.sink.write('\t'.join(COLUMNS) + '\n')
+        if(previous is not None and len(previous)):
+            self.rows.extend(previous[COLUMNS].astype(object).where(previous[COLUMNS].notna(), None).to_dict('records'))
+            self.flush()
+
+    def add(self, row):
+        """Add row of a finished genome (see summaryRow)"""
+        self.rows.append(row)
+        if(len(self.rows) >= self.flushRows or time.time() - self.lastFlush >= self.flushSeconds):
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows"""
+        self.lastFlush = time.time()
+        if(not self.rows):
+            return
+        if(self.writer is not None):
+            self.writer.write_batch(pa.RecordBatch.from_pylist(self.rows, _schema()))
+        else:
+            pd.DataFrame(self.rows, columns=COLUMNS).to_csv(self.sink, sep='\t', header=False, index=None)
+        self.sink.flush()
+        self.rows = []
+
+    def close(self):
+        """Flush, end the stream and write summary.parquet and summary_result.tsv
+
+        Returns:
+            [DataFrame] -- [summary of the batch]
+        """
+        self.flush()
+        if(self.writer is not None):
+            self.writer.close()
+        self.sink.close()
+        df = readSummary(self.outDir)
+        if(pa is not None):
+            pq.write_table(pa.Table.from_pandas(df, _schema(), preserve_index=False), os.path.join(self.outDir, PARQUET_FILE))
+            df.to_csv(os.path.join(self.outDir, TSV_FILE), sep='\t', index=None)
+        return df
+
+def compareRuns(reference, other, labels=('tblastn', 'blastp')):
+    """Compare features and predictions of two runs of the same genomes, e.g.
+    with the tblastn and the blastp search mode
+
+    Arguments:
+        reference {DataFrame} -- [summary rows (COLUMNS) of the reference run]
+        other {DataFrame} -- [summary rows (COLUMNS) of the run compared with it]
+        labels {tuple} -- [column suffixes of the two runs]
+
+    Returns:
+        [tuple] -- [per-genome DataFrame (values of both runs, number of differing features, prediction agreement),
+                    per-feature DataFrame (genomes done in both runs, equal values, mean and max absolute difference)]
+    """
+    a, b = labels
+    df = reference.set_index('genomeID').join(other.set_index('genomeID'), how='outer', lsuffix='_' + a, rsuffix='_' + b)
+    columns = ['genus_' + a, 'status_' + a, 'status_' + b]
+    for c in scoring.FEATURES + ['probiotic_probability', 'wall']:
+        columns += [c + '_' + a, c + '_' + b]
+    genomes = df[columns + ['prediction_' + a, 'prediction_' + b]].rename(columns={'genus_' + a: 'genus'})
+    done = (df['status_' + a] == 'done') & (df['status_' + b] == 'done')
+    diffs = dict([(c, (df[c + '_' + a] - df[c + '_' + b]).abs()[done]) for c in scoring.FEATURES + ['probiotic_probability']])
+    genomes['features_differing'] = pd.DataFrame([diffs[c] > 1e-9 for c in scoring.FEATURES]).sum().reindex(df.index)
+    genomes['prediction_agrees'] = (df['prediction_' + a] == df['prediction_' + b]).where(done)
+    features = [dict(feature=c, genomes=int(done.sum()), equal=int((diffs[c] <= 1e-9).sum()),
+                     mean_abs_diff=diffs[c].mean(), max_abs_diff=diffs[c].max()) for c in diffs]
+    features.append(dict(feature='prediction', genomes=int(done.sum()), equal=int(genomes['prediction_agrees'].sum())))
+    return genomes.reset_index(), pd.DataFrame(features)
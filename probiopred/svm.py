@@ -0,0 +1,144 @@
+import threading
+import numpy as np
+
+_modelCache = dict()
+_modelLock = threading.Lock()
+
+class SVMModel(object):
+    """C-SVC model with RBF kernel read from a libsvm model file.
+
+    The support vectors are kept as a dense matrix so that a whole batch of
+    genomes can be scored with one kernel evaluation. Probability estimates
+    use the Platt scaling parameters (probA/probB) stored in the model, the
+    same way as "svm-predict -b 1".
+    """
+
+    def __init__(self, modelFile):
+        """Parse libsvm model file
+
+        Arguments:
+            modelFile {str} -- [libsvm model file name]
+        """
+        header = dict()
+        coefs = []
+        rows = []
+        with open(modelFile, "r") as f:
+            for line in f:
+                line = line.strip()
+                if(line == "SV"):
+                    break
+                if(line):
+                    key, _, value = line.partition(" ")
+                    header[key] = value.split()
+            for line in f:
+                fields = line.split()
+                if(not fields):
+                    continue
+                coefs.append(float(fields[0]))
+                rows.append(dict((int(i), float(v)) for i, v in (t.split(":") for t in fields[1:])))
+        if(header.get("svm_type", [""])[0] != "c_svc" or header.get("kernel_type", [""])[0] != "rbf"):
+            raise ValueError(modelFile + " : only c_svc models with rbf kernel are supported")
+        if(int(header["nr_class"][0]) != 2):
+            raise ValueError(modelFile + " : only two class models are supported")
+        if("probA" not in header or "probB" not in header):
+            raise ValueError(modelFile + " : model was not trained with probability estimates")
+        self.modelFile = modelFile
+        self.gamma = float(header["gamma"][0])
+        self.rho = float(header["rho"][0])
+        self.probA = float(header["probA"][0])
+        self.probB = float(header["probB"][0])
+        self.labels = [int(i) for i in header["label"]]
+        self.nFeatures = max([max(r) for r in rows if r] + [0])
+        self.svCoef = np.array(coefs)
+        self.SV = np.zeros((len(rows), self.nFeatures))
+        for n, r in enumerate(rows):
+            for i, v in r.items():
+                self.SV[n, i - 1] = v
+        self.svSquare = np.einsum("ij,ij->i", self.SV, self.SV)
+
+    def decisionValues(self, X):
+        """Decision values of the model for each row of X
+
+        Arguments:
+            X {array} -- [genome x feature matrix]
+
+        Returns:
+            [array] -- [decision value for each genome]
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        SV = self.SV
+        svSquare = self.svSquare
+        if(X.shape[1] < SV.shape[1]):
+            X = np.pad(X, ((0, 0), (0, SV.shape[1] - X.shape[1])))
+        elif(X.shape[1] > SV.shape[1]):
+            SV = np.pad(SV, ((0, 0), (0, X.shape[1] - SV.shape[1])))
+        dist = np.einsum("ij,ij->i", X, X)[:, None] + svSquare[None, :] - 2 * X.dot(SV.T)
+        kernel = np.exp(-self.gamma * np.maximum(dist, 0))
+        return kernel.dot(self.svCoef) - self.rho
+
+    def predictProbability(self, X):
+        """Predict class labels and probability estimates for each row of X
+
+        Arguments:
+            X {array} -- [genome x feature matrix]
+
+        Returns:
+            [tuple] -- [array of predicted labels and genome x class probability matrix (columns ordered as self.labels)]
+        """
+        fApB = self.decisionValues(X) * self.probA + self.probB
+        # numerically stable sigmoid, as sigmoid_predict() in libsvm
+        e = np.exp(-np.abs(fApB))
+        p = np.where(fApB >= 0, e / (1.0 + e), 1.0 / (1.0 + e))
+        p = np.clip(p, 1e-7, 1 - 1e-7)
+        probs = np.column_stack([p, 1 - p])
+        labels = np.array(self.labels)[np.argmax(probs, axis=1)]
+        return labels, probs
+
+def loadModel(modelFile):
+    """Return parsed model, reading each model file only once per process
+
+    Arguments:
+        modelFile {str} -- [libsvm model file name]
+
+    Returns:
+        [SVMModel] -- [parsed model]
+    """
+    with _modelLock:
+        if(modelFile not in _modelCache):
+            _modelCache[modelFile] = SVMModel(modelFile)
+        return _modelCache[modelFile]
+
+def readLibSVM(testFile):
+    """Read libsvm formatted data file into dense matrix
+
+    Arguments:
+        testFile {str} -- [libsvm data file name]
+
+    Returns:
+        [array] -- [sample x feature matrix]
+    """
+    rows = []
+    with open(testFile, "r") as f:
+        for line in f:
+            fields = line.split()
+            if(fields):
+                rows.append(dict((int(i), float(v)) for i, v in (t.split(":") for t in fields[1:])))
+    X = np.zeros((len(rows), max([max(r) for r in rows if r] + [0])))
+    for n, r in enumerate(rows):
+        for i, v in r.items():
+            X[n, i - 1] = v
+    return X
+
+def writePredictions(outFile, model, labels, probs):
+    """Write predictions in the same format as "svm-predict -b 1"
+
+    Arguments:
+        outFile {str} -- [output file name]
+        model {SVMModel} -- [model used for prediction]
+        labels {array} -- [predicted labels]
+        probs {array} -- [class probability matrix]
+    """
+    with open(outFile, "w") as out:
+        out.write("labels " + " ".join(str(i) for i in model.labels) + "\n")
+        for label, p in zip(labels, probs):
+            out.write(str(label) + " " + " ".join("%g" % i for i in p) + "\n")
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import glob
+import resource
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from probiopred import cache
+
+def fileBytes(fileNames):
+    """Total size of files, directories or BLAST database prefixes (name.*)
+
+    Arguments:
+        fileNames {list} -- [file names]
+
+    Returns:
+        [int] -- [size in bytes]
+    """
+    size = 0
+    for fileName in fileNames:
+        if(os.path.isfile(fileName)):
+            size += os.path.getsize(fileName)
+        elif(os.path.isdir(fileName)):
+            size += cache.dirSize(fileName)
+        else:
+            size += sum(os.path.getsize(f) for f in glob.glob(glob.escape(fileName) + ".*") if os.path.isfile(f))
+    return size
+
+def _cpu(usage):
+    return usage.ru_utime + usage.ru_stime
+
+class Trace(object):
+    """Wall time, CPU time, peak RSS and I/O sizes of the stages of one
+    genome run, written to trace.json.
+
+    CPU and RSS figures come from getrusage of this process (cpu_self) and of
+    its terminated children (cpu_children), so they are exact when stages of
+    one genome run one after another in a process. Peak RSS values are the
+    high-water marks of the process and of its largest child up to the end of
+    the stage.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, inputs=(), outputs=()):
+        """Measure the enclosed block as stage name. The yielded record can be
+        extended with counts, e.g. record["output_bytes"] for streamed output.
+
+        Arguments:
+            name {str} -- [stage name]
+            inputs {list} -- [input files, sized before the stage]
+            outputs {list} -- [output files, sized after the stage]
+        """
+        record = dict(name=name, input_bytes=fileBytes(inputs))
+        selfStart, childStart = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.time()
+        try:
+            yield record
+        except Exception:
+            record["failed"] = True
+            raise
+        finally:
+            end = time.time()
+            selfEnd, childEnd = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+            record.update(start=start - self.start, wall=end - start,
+                          cpu_self=_cpu(selfEnd) - _cpu(selfStart), cpu_children=_cpu(childEnd) - _cpu(childStart),
+                          peak_rss_self_kb=selfEnd.ru_maxrss, peak_rss_children_kb=childEnd.ru_maxrss)
+            if("output_bytes" not in record):
+                record["output_bytes"] = fileBytes(outputs)
+            self.stages.append(record)
+
+    def add(self, name, start, end, **counts):
+        """Record a stage timed elsewhere, e.g. one of concurrently run commands
+
+        Arguments:
+            name {str} -- [stage name]
+            start {float} -- [start time (epoch seconds)]
+            end {float} -- [end time (epoch seconds)]
+        """
+        self.stages.append(dict(name=name, start=start - self.start, wall=end - start, **counts))
+
+    def write(self, fileName, **info):
+        """Write trace as JSON
+
+        Arguments:
+            fileName {str} -- [output file name]
+            info {dict} -- [run details, e.g. genome and genus]
+        """
+        info.update(wall=time.time() - self.start, stages=self.stages)
+        with open(fileName + ".tmp", "w") as out:
+            json.dump(info, out, indent=1)
+        os.replace(fileName + ".tmp", fileName)
+
+def stageSummary(traceFiles):
+    """Per-stage percentiles of the traces of many genomes
+
+    Arguments:
+        traceFiles {list} -- [trace.json file names]
+
+    Returns:
+        [DataFrame] -- [stage x (n, mean, p50, p90, p99 and max of wall time, CPU time and peak child RSS)]
+    """
+    rows = []
+    for traceFile in traceFiles:
+        try:
+            with open(traceFile, "r") as f:
+                trace = json.load(f)
+        except (IOError, ValueError):
+            continue
+        rows.append(dict(name="total", wall=trace["wall"]))
+        rows.extend(trace["stages"])
+    columns = ["stage", "n"] + ["%s_%s" % (m, s) for m in ("wall", "cpu_self", "cpu_children", "peak_rss_children_kb")
+                                for s in ("mean", "p50", "p90", "p99", "max")]
+    if(not rows):
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(rows)
+    summary = []
+    for name, group in df.groupby("name", sort=False):
+        row = dict(stage=name, n=len(group))
+        for m in ("wall", "cpu_self", "cpu_children", "peak_rss_children_kb"):
+            values = group[m].dropna().to_numpy(dtype=float) if m in group else np.array([])
+            if(len(values)):
+                row.update([(m + "_mean", values.mean()), (m + "_max", values.max())])
+                row.update([("%s_p%d" % (m, q), np.percentile(values, q)) for q in (50, 90, 99)])
+        summary.append(row)
+    return pd.DataFrame(summary).reindex(columns=columns)
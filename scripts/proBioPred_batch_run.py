@@ -3,72 +3,277 @@
 import argparse
 import os
 import sys
-import subprocess
-import pandas as pd
+import csv
+import io
 import shutil
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import probiopred.probiopred as mydef
+from probiopred import cache
+from probiopred import pipeline
+from probiopred import refstore
+from probiopred import trace
+from probiopred import summary
 
-parser = argparse.ArgumentParser(description="Wrapper for running ProBioPred for batch of genomes. Searches for "
-                                             "probiotic, virulent and antibiotic resistence "
-                                             "genes in query genomes. Then predicts the probability "
-                                             "score of genome being probiotic or non-probiotic "
-                                             "based on SVM model.")
-parser.add_argument('-b','--batch_file',metavar='PATH',required=True,
-                    type=str,help='Genome batch file. (Tab separated with two columns, genomeID, genomeFile and genus). Genus must be from one of the following [bacillus, clostridium, lactobacillus, leuconostoc, streptococcus, '
-                         'bifidobacterium, enterococcus, lactococcus, pediococcus]')
-parser.add_argument('-o','--output_dir',metavar='PATH',required=False,
-                    default='ProBioPred_out',type=str,help='Path of output directory [Default: ProBioPred_out].')
-parser.add_argument('-t','--threads',default=1,type=int,
-                    help='Number of threads to run for BLAST and RGI.')
-
-args = parser.parse_args()
-
-batch_file = args.batch_file
-userFolder = args.output_dir
-threads = str(args.threads)
-
-# 1. read and validate batch file
-df_batch = pd.read_csv(batch_file,sep='\t')
-
-# 2. validate batch file
-if(sum(['genomeID', 'genomeFile', 'genus'] == df_batch.columns) != 3):
-    exit('Please validate the column names of batch file. It must be tab separated and should have 3 columns: genomeID, genomeFile, genus')
-if(len(set(df_batch['genomeID'])) != df_batch.shape[0]):
-    exit('genomIDs must have unique names')
-
-# 3. make directory for output
-cwd = os.getcwd()
-os.chdir(cwd)
-if (os.path.exists(userFolder)):
-    flag = input("Directory " + userFolder + " already exists. Enter \"1\" to overwrite or \"0\" to exit. \n")
-    if (flag == "1"):
-        shutil.rmtree(userFolder)
-        os.mkdir(userFolder)
-        cwd = os.path.join(cwd,userFolder)
+MANIFEST_COLUMNS = ['genomeID', 'genomeFile', 'genus', 'status', 'message', 'start', 'end']
+
+def journalFile(manifestFile):
+    """Journal of a manifest, holding the rows of the genomes finished since
+    the manifest was last written (manifest.tsv => manifest.journal)"""
+    return os.path.splitext(manifestFile)[0] + ".journal"
+
+def readManifest(manifestFile):
+    """Read per-genome status of a batch, replaying the rows of its journal
+    over the manifest
+
+    Arguments:
+        manifestFile {str} -- [manifest filename]
+
+    Returns:
+        [dict] -- [genomeID => manifest row (dict)]
+    """
+    with open(manifestFile, "r", newline="") as f:
+        manifest = dict([(row['genomeID'], row) for row in csv.DictReader(f, delimiter='\t')])
+    if(os.path.isfile(journalFile(manifestFile))):
+        with open(journalFile(manifestFile), "r", newline="") as f:
+            text = f.read()
+        #last row may be cut short by a crash
+        text = text[:text.rfind("\n") + 1]
+        for row in csv.DictReader(io.StringIO(text, newline=""), fieldnames=MANIFEST_COLUMNS, delimiter='\t'):
+            if(row['end'] is not None and row['genomeID'] in manifest):
+                manifest[row['genomeID']] = row
+    return manifest
+
+def writeManifest(manifest, manifestFile):
+    """Write manifest atomically, so that an interrupted batch never leaves a
+    truncated manifest behind, and empty its journal.
+
+    Arguments:
+        manifest {dict} -- [genomeID => manifest row (dict)]
+        manifestFile {str} -- [manifest filename]
+    """
+    with open(manifestFile + ".tmp", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        for row in manifest.values():
+            writer.writerow(row)
+    os.replace(manifestFile + ".tmp", manifestFile)
+    if(os.path.isfile(journalFile(manifestFile))):
+        os.remove(journalFile(manifestFile))
+
+def main():
+    parser = argparse.ArgumentParser(description="Wrapper for running ProBioPred for batch of genomes. Searches for "
+                                                 "probiotic, virulent and antibiotic resistence "
+                                                 "genes in query genomes. Then predicts the probability "
+                                                 "score of genome being probiotic or non-probiotic "
+                                                 "based on SVM model.")
+    parser.add_argument('-b','--batch_file',metavar='PATH',required=True,
+                        type=str,help='Genome batch file. (Tab separated with two columns, genomeID, genomeFile and genus). Genus must be from one of the following [bacillus, clostridium, lactobacillus, leuconostoc, streptococcus, '
+                             'bifidobacterium, enterococcus, lactococcus, pediococcus]')
+    parser.add_argument('-o','--output_dir',metavar='PATH',required=False,
+                        default='ProBioPred_out',type=str,help='Path of output directory [Default: ProBioPred_out]. '
+                             'If it contains a manifest of an earlier run, the batch is resumed.')
+    parser.add_argument('-t','--threads',default=1,type=int,
+                        help='Total number of cores for the batch. They are split between concurrent '
+                             'genomes and the BLAST/RGI threads of each genome.')
+    parser.add_argument('-j','--jobs',default=None,type=int,
+                        help='Number of genomes to run concurrently [Default: threads/4, at least 1].')
+    parser.add_argument('--retry_failed',action='store_true',
+                        help='When resuming, run again the genomes which failed earlier.')
+    parser.add_argument('--overwrite',action='store_true',
+                        help='Remove existing output directory which is not a ProBioPred batch.')
+    parser.add_argument('--cache_dir',metavar='PATH',default=cache.defaultCacheDir,type=str,
+                        help='Directory for caching genome BLAST databases and RGI results across runs '
+                             '[Default: $PROBIOPRED_CACHE or ~/.cache/probiopred].')
+    parser.add_argument('--cache_size',metavar='GB',default=20,type=float,
+                        help='Size cap of the BLAST database cache and of the RGI result cache in GB [Default: 20].')
+    parser.add_argument('--no_cache',action='store_true',
+                        help='Build genome BLAST databases in the output directories and run RGI without caching.')
+
+    parser.add_argument('--timeout',metavar='SECONDS',default=None,type=float,
+                        help='Kill RGI or tblastn if it runs longer than this [Default: no limit].')
+
+    parser.add_argument('--keep_blast',action='store_true',
+                        help='Write filtered BLAST hits (pro_outFiltered.blast, vfdb_outFiltered.blast).')
+
+    parser.add_argument('--combined_hits',action='store_true',
+                        help='Write hit sequences of all genomes to pro_hits.pfasta and vfdb_hits.pfasta in the output '
+                             'directory (ids tagged as genomeID__gene) instead of one pair of files per genome.')
+
+    parser.add_argument('--search_mode',default='tblastn',type=str,choices=mydef.SEARCH_MODES,
+                        help='Search the probiotic and virulence genes with tblastn against the genome, or with blastp '
+                             'against the proteins of its six-frame ORFs, translated once and cached [Default: tblastn].')
+
+    parser.add_argument('--group_search',action='store_true',
+                        help='Search the genomes of each genus together: one BLAST database of up to --group_size genomes '
+                             'and one tblastn run per group, split into per-genome hits.')
+    parser.add_argument('--group_size',default=100,type=int,
+                        help='Number of genomes in a group of --group_search [Default: 100].')
+
+    args = parser.parse_args()
+    if(args.group_search and args.search_mode != 'tblastn'):
+        exit('--group_search searches the genomes with tblastn, it cannot be combined with --search_mode ' + args.search_mode)
+
+    batch_file = args.batch_file
+    userFolder = args.output_dir
+    jobs = args.jobs or max(1, args.threads // 4)
+    jobs = max(1, min(jobs, args.threads))
+    jobThreads = max(1, args.threads // jobs)
+    manifestFile = os.path.join(userFolder, 'manifest.tsv')
+
+    # 1. read and validate batch file
+    df_batch = pd.read_csv(batch_file,sep='\t',dtype=str)
+
+    # 2. validate batch file
+    if(sum(['genomeID', 'genomeFile', 'genus'] == df_batch.columns) != 3):
+        exit('Please validate the column names of batch file. It must be tab separated and should have 3 columns: genomeID, genomeFile, genus')
+    if(len(set(df_batch['genomeID'])) != df_batch.shape[0]):
+        exit('genomIDs must have unique names')
+
+    # 3. make directory for output or resume earlier batch
+    manifest = dict()
+    if(os.path.isfile(manifestFile)):
+        previous = readManifest(manifestFile)
+    elif(os.path.exists(userFolder) and not args.overwrite):
+        exit("Directory " + userFolder + " already exists and is not a ProBioPred batch. Use --overwrite to replace it.")
     else:
-        exit("Exiting...")
-else:
-    os.mkdir(userFolder)
-    cwd = os.path.join(cwd,userFolder)
-
-# 4. loop over and run probiopred
-for genomeId, genomeFile, genus in zip(df_batch['genomeID'], df_batch['genomeFile'], df_batch['genus']):
-    genomeId = genomeId.strip()
-    genomeFile = genomeFile.strip()
-    genus = genus.strip()
-    outDir = os.path.join(userFolder,genomeId)
-    cmd = 'proBioPred.py -i ' + genomeFile + ' -g ' + genus + ' -o ' + outDir + ' -t ' + threads
-    print(cmd)
-    subProbiopred = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True)
-    output,error = subProbiopred.communicate()
-    if(subProbiopred.returncode != 0):
-        exit(error)
-
-# 5. collect data and make summary
-df_list = []
-for genome, result in zip(os.listdir(userFolder), [os.path.join(os.getcwd(),userFolder,i,'resulTab.csv') for i in os.listdir(userFolder)]):
-    df = pd.read_csv(result, sep='\t')
-    df = df[['prediction', 'prediction_score']]
-    df['genomeID'] = genome
-    df_list.append(df)
-df_final = pd.concat(df_list)
-df_final.to_csv(os.path.join(userFolder, 'summary_result.tsv'),sep='\t')
\ No newline at end of file
+        if(os.path.exists(userFolder)):
+            shutil.rmtree(userFolder)
+        os.mkdir(userFolder)
+        previous = dict()
+    for genomeId, genomeFile, genus in zip(df_batch['genomeID'], df_batch['genomeFile'], df_batch['genus']):
+        genomeId, genomeFile, genus = genomeId.strip(), genomeFile.strip(), genus.strip().lower()
+        row = dict(genomeID=genomeId, genomeFile=genomeFile, genus=genus, status='pending', message='', start='', end='')
+        old = previous.get(genomeId)
+        if(old and old['genomeFile'] == genomeFile and old['genus'] == genus):
+            if(old['status'] == 'done' and os.path.isfile(os.path.join(userFolder, genomeId, 'resulTab.csv'))):
+                row = old
+            elif(old['status'] == 'failed' and not args.retry_failed):
+                row = old
+        if(genus not in mydef.GENERA):
+            row.update(status='failed', message='Unsupported genus : ' + genus)
+        manifest[genomeId] = row
+    writeManifest(manifest, manifestFile)
+
+    # summary of the genomes finished in earlier runs, taken from resulTab.csv for
+    # batches started before the columnar summary existed
+    kept = dict([(genomeId, row) for genomeId, row in manifest.items() if row['status'] in ('done', 'failed')])
+    previous = summary.readSummary(userFolder)
+    previous = previous.loc[previous['genomeID'].isin(kept)].drop_duplicates('genomeID', keep='last')
+    previousIds = set(previous['genomeID'])
+    missing = []
+    for genomeId, row in kept.items():
+        if(genomeId in previousIds):
+            continue
+        start, end = [time.mktime(time.strptime(row[t], '%Y-%m-%dT%H:%M:%S')) if row[t] else time.time() for t in ('start', 'end')]
+        result = None
+        if(row['status'] == 'done'):
+            result = pd.read_csv(os.path.join(userFolder, genomeId, 'resulTab.csv'), sep='\t').iloc[0].to_dict()
+        missing.append(summary.summaryRow(genomeId, row['genus'], row['genomeFile'], row['status'], row['message'], start, end, result))
+    if(missing and previous.empty):
+        previous = pd.DataFrame(missing, columns=summary.COLUMNS)
+    elif(missing):
+        previous = pd.concat([previous, pd.DataFrame(missing, columns=summary.COLUMNS)], ignore_index=True)
+    summaryWriter = summary.SummaryWriter(userFolder, previous)
+
+    # 4. run genomes concurrently. With --group_search, the genomes of every genus are
+    #    first searched together in groups, then each genome is scored with its hits.
+    todo = [row for row in manifest.values() if row['status'] == 'pending']
+    print("%d genomes, %d to run (%d concurrent x %d threads)" % (len(manifest), len(todo), jobs, jobThreads), file=sys.stderr)
+    groupFolder = os.path.join(userFolder, 'groups')
+    done = [0]
+
+    def finished(genomeId, status, message, start, end, hits=dict(), result=None):
+        if(args.combined_hits):
+            proFile, vfdbFile, model = mydef.readInput(manifest[genomeId]['genus'])
+            for tag, referenceFile in (('pro', proFile), ('vfdb', vfdbFile)):
+                if(tag in hits):
+                    refstore.loadStore(referenceFile).extractBatch({genomeId: hits[tag]}, os.path.join(userFolder, tag + '_hits.pfasta'), 'a')
+        manifest[genomeId].update(status=status, message=message,
+                                  start=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start)),
+                                  end=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(end)))
+        #one journal line per genome instead of rewriting the whole manifest
+        journal.writerow(manifest[genomeId])
+        journalOut.flush()
+        row = manifest[genomeId]
+        summaryWriter.add(summary.summaryRow(genomeId, row['genus'], row['genomeFile'], status, message, start, end, result))
+        done[0] += 1
+        print("[%d/%d] %s %s : %s" % (done[0], len(todo), genomeId, status, message), file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = dict()
+        groups = dict()
+
+        def submitGenome(row, searchHits=None):
+            future = executor.submit(pipeline.batchJob, row['genomeID'], row['genomeFile'], row['genus'],
+                                     os.path.join(userFolder, row['genomeID']), jobThreads,
+                                     args.cache_dir, int(args.cache_size * 1024 ** 3), not args.no_cache, args.timeout, args.keep_blast,
+                                     not args.combined_hits, searchHits, args.search_mode)
+            futures[future] = ('genome', searchHits)
+            row['status'] = 'running'
+
+        if(args.group_search):
+            byGenus = dict()
+            for row in todo:
+                byGenus.setdefault(row['genus'], []).append(row)
+            for genus, rows in byGenus.items():
+                for i in range(0, len(rows), max(1, args.group_size)):
+                    groupId = "%s_%d" % (genus, len(groups) + 1)
+                    groups[groupId] = rows[i:i + max(1, args.group_size)]
+                    future = executor.submit(pipeline.groupJob, groupId, dict([(r['genomeID'], r['genomeFile']) for r in groups[groupId]]),
+                                             genus, os.path.join(groupFolder, groupId), jobThreads, args.timeout)
+                    futures[future] = ('group', groupId)
+                    for r in groups[groupId]:
+                        r['status'] = 'running'
+        else:
+            for row in todo:
+                submitGenome(row)
+        writeManifest(manifest, manifestFile)
+        journalOut = open(journalFile(manifestFile), "a", newline="")
+        journal = csv.DictWriter(journalOut, fieldnames=MANIFEST_COLUMNS, delimiter='\t')
+        try:
+            while(futures):
+                completed, pending = wait(futures, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    kind, key = futures.pop(future)
+                    if(kind == 'group'):
+                        groupId, status, message, hitFiles, failures = future.result()
+                        if(status == 'failed'):
+                            print("group %s failed, searching its genomes one by one : %s" % (groupId, message), file=sys.stderr)
+                        for row in groups[groupId]:
+                            if(row['genomeID'] in hitFiles):
+                                submitGenome(row, hitFiles[row['genomeID']])
+                            elif(row['genomeID'] in failures):
+                                finished(row['genomeID'], 'failed', failures[row['genomeID']], time.time(), time.time())
+                            else:
+                                #search of the group failed (makeblastdb or tblastn), not the genome
+                                submitGenome(row)
+                    else:
+                        genomeId, status, message, start, end, hits, result = future.result()
+                        finished(genomeId, status, message, start, end, hits, result)
+                        if(key is not None):
+                            #hits of the group search, no longer needed
+                            os.remove(key)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            journalOut.close()
+            writeManifest(manifest, manifestFile)
+            summaryWriter.close()
+            exit("Interrupted. Run the same command again to resume the batch.")
+        journalOut.close()
+    writeManifest(manifest, manifestFile)
+
+    # 5. summary of all genomes (summary.parquet, summary_result.tsv)
+    summaryWriter.close()
+
+    # 6. per-stage time and resource percentiles from the genome traces
+    traceFiles = [os.path.join(userFolder, genomeId, 'trace.json') for genomeId in manifest]
+    trace.stageSummary([f for f in traceFiles if os.path.isfile(f)]).to_csv(os.path.join(userFolder, 'stage_summary.tsv'),
+                                                                            sep='\t', index=None, float_format='%.4g')
+    failed = [row['genomeID'] for row in manifest.values() if row['status'] == 'failed']
+    if(failed):
+        print("%d genomes failed, see %s" % (len(failed), manifestFile), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import sys
+import probiopred.probiopred as mydef
+from probiopred import cache
+from probiopred import server
+
+parser = argparse.ArgumentParser(description="ProBioPred prediction server. Keeps the genus models, category "
+                                             "tables, ARO index and reference proteins loaded and scores genomes "
+                                             "submitted as JSON over a localhost HTTP port or a unix socket.")
+parser.add_argument('--host',default='127.0.0.1',type=str,
+                    help='Address to listen on [Default: 127.0.0.1].')
+parser.add_argument('-p','--port',default=8765,type=int,
+                    help='Port to listen on [Default: 8765].')
+parser.add_argument('-s','--socket',metavar='PATH',default=None,type=str,
+                    help='Listen on this unix socket instead of a TCP port.')
+parser.add_argument('-w','--workers',default=1,type=int,
+                    help='Number of genomes scored concurrently [Default: 1].')
+parser.add_argument('-t','--threads',default=1,type=int,
+                    help='Number of threads to run for BLAST and RGI per genome, unless the job sets it.')
+parser.add_argument('-o','--output_dir',metavar='PATH',default='ProBioPred_server',type=str,
+                    help='Directory for job outputs, one sub-directory per job id [Default: ProBioPred_server].')
+parser.add_argument('--cache_dir',metavar='PATH',default=cache.defaultCacheDir,type=str,
+                    help='Directory for caching genome BLAST databases and RGI results across runs '
+                         '[Default: $PROBIOPRED_CACHE or ~/.cache/probiopred].')
+parser.add_argument('--cache_size',metavar='GB',default=20,type=float,
+                    help='Size cap of the BLAST database cache and of the RGI result cache in GB [Default: 20].')
+parser.add_argument('--no_cache',action='store_true',
+                    help='Build genome BLAST databases in the job output directories and run RGI without caching.')
+parser.add_argument('--search_mode',default='tblastn',type=str,choices=mydef.SEARCH_MODES,
+                    help='Search program for jobs which do not set search_mode: tblastn against the genome, or blastp '
+                         'against its translated ORFs [Default: tblastn].')
+parser.add_argument('--timeout',metavar='SECONDS',default=None,type=float,
+                    help='Kill RGI or tblastn if it runs longer than this [Default: no limit].')
+
+args = parser.parse_args()
+
+queue = server.JobQueue(max(1, args.workers), args.threads, args.output_dir, args.cache_dir,
+                        int(args.cache_size * 1024 ** 3), not args.no_cache, args.timeout, args.search_mode)
+if(args.socket):
+    print("ProBioPred server listening on " + os.path.abspath(args.socket), file=sys.stderr)
+else:
+    print("ProBioPred server listening on http://%s:%d" % (args.host, args.port), file=sys.stderr)
+server.serve(queue, args.host, args.port, args.socket)
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import sys
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import probiopred.probiopred as mydef
+from probiopred import cache
+from probiopred import pipeline
+from probiopred import summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the blastp search mode against tblastn. Runs ProBioPred "
+                                                 "on a reference set of genomes with both search modes and reports "
+                                                 "per genome and per feature how the feature vectors and the "
+                                                 "predictions differ.")
+    parser.add_argument('-b','--batch_file',metavar='PATH',required=True,
+                        type=str,help='Reference genome batch file (tab separated with three columns, genomeID, genomeFile and genus, '
+                                      'see proBioPred_batch_run.py).')
+    parser.add_argument('-o','--output_dir',metavar='PATH',required=False,
+                        default='ProBioPred_validation',type=str,
+                        help='Path of output directory, with the runs in tblastn/ and blastp/ [Default: ProBioPred_validation].')
+    parser.add_argument('-t','--threads',default=4,type=int,
+                        help='Total number of cores, split between concurrent genomes and the BLAST/RGI threads of each genome.')
+    parser.add_argument('-j','--jobs',default=None,type=int,
+                        help='Number of genomes to run concurrently [Default: threads/4, at least 1].')
+    parser.add_argument('--cache_dir',metavar='PATH',default=cache.defaultCacheDir,type=str,
+                        help='Directory for caching genome BLAST databases and RGI results across runs '
+                             '[Default: $PROBIOPRED_CACHE or ~/.cache/probiopred].')
+    parser.add_argument('--cache_size',metavar='GB',default=20,type=float,
+                        help='Size cap of the BLAST database cache and of the RGI result cache in GB [Default: 20].')
+    parser.add_argument('--timeout',metavar='SECONDS',default=None,type=float,
+                        help='Kill RGI or BLAST if it runs longer than this [Default: no limit].')
+    args = parser.parse_args()
+
+    jobs = args.jobs or max(1, args.threads // 4)
+    jobs = max(1, min(jobs, args.threads))
+    jobThreads = max(1, args.threads // jobs)
+
+    # 1. read and validate batch file
+    df_batch = pd.read_csv(args.batch_file,sep='\t',dtype=str)
+    if(sum(['genomeID', 'genomeFile', 'genus'] == df_batch.columns) != 3):
+        exit('Please validate the column names of batch file. It must be tab separated and should have 3 columns: genomeID, genomeFile, genus')
+    if(len(set(df_batch['genomeID'])) != df_batch.shape[0]):
+        exit('genomIDs must have unique names')
+    genomes = [(genomeId.strip(), genomeFile.strip(), genus.strip().lower())
+               for genomeId, genomeFile, genus in zip(df_batch['genomeID'], df_batch['genomeFile'], df_batch['genus'])]
+    unsupported = sorted(set(genus for genomeId, genomeFile, genus in genomes if genus not in mydef.GENERA))
+    if(unsupported):
+        exit('Unsupported genus : ' + ', '.join(unsupported))
+
+    # 2. run every genome with both search modes, one mode after the other: the RGI
+    #    results of the first pass are in the cache when the second pass starts
+    rows = dict([(mode, []) for mode in mydef.SEARCH_MODES])
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for mode in mydef.SEARCH_MODES:
+            futures = dict()
+            for genomeId, genomeFile, genus in genomes:
+                future = executor.submit(pipeline.batchJob, genomeId, genomeFile, genus, os.path.join(args.output_dir, mode, genomeId),
+                                         jobThreads, args.cache_dir, int(args.cache_size * 1024 ** 3), True, args.timeout,
+                                         False, False, None, mode)
+                futures[future] = (genomeFile, genus)
+            for future in as_completed(futures):
+                genomeFile, genus = futures[future]
+                genomeId, status, message, start, end, hits, result = future.result()
+                rows[mode].append(summary.summaryRow(genomeId, genus, genomeFile, status, message, start, end, result))
+                print("%s %s %s : %s" % (mode, genomeId, status, message), file=sys.stderr)
+
+    # 3. compare feature vectors and predictions
+    byGenome, byFeature = summary.compareRuns(pd.DataFrame(rows['tblastn'], columns=summary.COLUMNS),
+                                              pd.DataFrame(rows['blastp'], columns=summary.COLUMNS))
+    byGenome.to_csv(os.path.join(args.output_dir, 'search_validation.tsv'), sep='\t', index=None, float_format='%.6g')
+    byFeature.to_csv(os.path.join(args.output_dir, 'search_validation_summary.tsv'), sep='\t', index=None, float_format='%.6g')
+    print(byFeature.to_string(index=False, float_format='%.4g'))
+    n = byFeature['genomes'].iloc[0]
+    print("\n%d of %d genomes done with both modes, predictions agree for %d, feature vectors identical for %d" %
+          (n, len(genomes), byFeature['equal'].iloc[-1], int((byGenome['features_differing'] == 0).sum())))
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,7 @@ setup(name='ProBioPred',
       url='https://github.com/microDM/ProBioPred',
       packages=['probiopred'],
       scripts=glob('scripts/*py'),
-      install_requires=['biopython==1.81', 'pandas==2.1.1'],
+      install_requires=['pandas==2.1.1', 'numpy'],
+      extras_require={'columnar': ['pyarrow']},
       package_data={'probiopred': files},
       long_description=long_description)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import os
+import json
+import threading
+import http.client
+from http.server import ThreadingHTTPServer
+import pytest
+from probiopred import server
+
+@pytest.fixture(scope="module")
+def queue(tmp_path_factory):
+    queue = server.JobQueue(1, 1, str(tmp_path_factory.mktemp("jobs")), str(tmp_path_factory.mktemp("cache")), 0)
+    yield queue
+    queue.shutdown()
+
+@pytest.fixture(scope="module")
+def httpd(queue):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.makeHandler(queue))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def genomeFile(tmp_path):
+    genomeFile = tmp_path / "genome.fasta"
+    genomeFile.write_text(">contig1\nACGTACGTACGT\n")
+    return str(genomeFile)
+
+def post(httpd, body):
+    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=10)
+    conn.request("POST", "/jobs", body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    reply = response.status, json.loads(response.read())
+    conn.close()
+    return reply
+
+@pytest.mark.parametrize("body", ["[1, 2]", '"x"', "3", "null"])
+def test_job_not_an_object(httpd, body):
+    status, reply = post(httpd, body)
+    assert status == 400
+    assert "JSON object" in reply["error"]
+
+@pytest.mark.parametrize("threads", [0, -1, "x", 1.5, True])
+def test_invalid_threads(queue, genomeFile, threads):
+    with pytest.raises(ValueError, match="threads"):
+        queue.submit(dict(genome=genomeFile, genus="lactobacillus", threads=threads))
+
+@pytest.mark.parametrize("jobId", [".", "...", "../x", "a/b"])
+def test_invalid_id(queue, genomeFile, jobId):
+    with pytest.raises(ValueError, match="id"):
+        queue.submit(dict(genome=genomeFile, genus="lactobacillus", id=jobId))
+
+@pytest.mark.parametrize("outDir", ["/tmp", "..", ".", "../elsewhere", "sub/../../elsewhere"])
+def test_output_dir_outside_work_dir(queue, genomeFile, outDir):
+    with pytest.raises(ValueError, match="output_dir"):
+        queue.submit(dict(genome=genomeFile, genus="lactobacillus", output_dir=outDir))
+
+def test_output_dir_inside_work_dir(queue, genomeFile):
+    status = queue.submit(dict(genome=genomeFile, genus="lactobacillus", id="job1", output_dir="runs/job1"))
+    assert status["output_dir"] == os.path.join(os.path.realpath(queue.workDir), "runs", "job1")
+    status = queue.submit(dict(genome=genomeFile, genus="lactobacillus", id="job2"))
+    assert status["output_dir"] == os.path.join(os.path.realpath(queue.workDir), "job2")
+    queue.wait("job1", 60)
+    queue.wait("job2", 60)
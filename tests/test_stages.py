@@ -0,0 +1,19 @@
+import sys
+from probiopred import stages
+
+def test_stage_output():
+    results = stages.runStages([stages.Stage('echo', [sys.executable, '-c', 'print("hit")'])])
+    returncode, stdout, stderr = results['echo']
+    assert returncode == 0
+    assert stdout == [b'hit\n']
+    assert stages.checkResponse(results['echo']) == True
+
+def test_missing_command():
+    stage = stages.Stage('makeblastdb', ['probiopred-no-such-tool', '-in', 'genome.fasta'])
+    results = stages.runStages([stage])
+    returncode, stdout, stderr = results['makeblastdb']
+    assert returncode == 127
+    response = stages.checkResponse(results['makeblastdb'])
+    assert response != True
+    assert 'probiopred-no-such-tool' in response[0]
+    assert stage.start is not None and stage.end is not None